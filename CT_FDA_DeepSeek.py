@@ -1,25 +1,21 @@
 import streamlit as st
-import sys
-from io import StringIO
-from groq import Groq
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import os
-import re
 from dotenv import load_dotenv
 import pandas as pd
-from typing import Literal, TypedDict, Annotated
 from IPython.display import Image, display
-from langgraph.graph import StateGraph, START, END, MessagesState
-from langgraph.graph.message import add_messages
 from langgraph.prebuilt import ToolNode
 from langgraph.prebuilt import tools_condition
 # from pprint import pprint
-from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, AnyMessage
-from langchain_openai import ChatOpenAI
-from langgraph.types import Command
-from clinical_trials_module import get_clinical_trials_data
+from clinical_trials_module import copy_lookups
+from study_store import get_study_store
+from label_store import get_label_store
+from drug_synonyms import get_drug_synonyms
 from openfda import Open_FDA
-from context import fda_context, clinical_trial_context
-import traceback
+from text_index import TextIndex
+from data_cache import get_data_cache
+from sandbox import get_sandbox_pool
+from workflow import SessionData, get_code_cache, run_question
 
 # Set up environment variables
 # os.environ["GROQ_API_KEY"]= st.secrets["GROQ_API_KEY"]
@@ -34,6 +30,13 @@ os.environ["LANGCHAIN_API_KEY"] = st.secrets["LANGCHAIN_API_KEY"]
 os.environ["LANGCHAIN_TRACING_V2"] = st.secrets["LANGCHAIN_TRACING_V2"]
 os.environ["LANGCHAIN_PROJECT"] = st.secrets["LANGCHAIN_PROJECT"]
 
+# Sessions share the cached DataFrames through shallow copies (see data_cache). Under
+# Copy-on-Write a write through such a copy, by the app or by generated code, copies the
+# columns it touches first, so it never changes another session's data. The mode applies
+# to all pandas code in this process: chained assignment such as df['a'][mask] = x has no
+# effect, which the code-generation prompt tells the model. Sandbox workers enable it too.
+pd.options.mode.copy_on_write = True
+
 
 # Initialize Streamlit app
 st.title("Clinical Trial and FDA Drug Data Analysis using OpenAI(ChatGPT) ֎🇦🇮")
@@ -70,44 +73,116 @@ def display_db_connection_menu():
 
 display_db_connection_menu()
 
+# The stores and the name index are opened once per process, not on every rerun
+study_store = get_study_store()
+# Answers Open FDA searches locally once label_loader.py has imported the bulk download
+label_store = get_label_store()
+# Brand/generic/substance names -> ingredients (data/drug_synonyms.json or the label mirror), None if neither exists
+drug_synonyms = get_drug_synonyms()
+# Generated code runs in these worker processes, with a time limit and memory cap (SANDBOX_* settings)
+sandbox_pool = get_sandbox_pool(drug_synonyms)
+
+# Shared by every session of this process; sessions get shallow copies of the cached frames,
+# which Copy-on-Write (enabled by data_cache) keeps private to the session
+data_cache = get_data_cache()
+
+def _cache_term(keyword):
+    return " ".join(str(keyword).lower().split())
+
+def fetch_clinical_trials(keyword):
+    """Fetch and cache the clinical trials tables (DataFrame, companion tables, lookups) for the given keyword."""
+    return data_cache.get_or_load(
+        ('ct', _cache_term(keyword)),
+        lambda: study_store.get_clinical_trials_tables(keyword),
+    )
+
 def fetch_open_fda(domain, keyword):
-    """Fetch and cache Open FDA data based on the given domain and keyword."""
-    return Open_FDA.open_fda_main(domain=domain, user_keyword=keyword)
+    """Fetch and cache Open FDA data based on the given domain and keyword, with the heavy label sections parked on disk."""
+    return data_cache.get_or_load(
+        ('fda', _cache_term(keyword), domain),
+        lambda: Open_FDA.open_fda_main(domain=domain, user_keyword=keyword, store=label_store, lazy=True, synonyms=drug_synonyms),
+        cacheable=lambda result: result[0] is not None,  # failed requests are retried by the next session
+    )
 
 if st.session_state.CONNECTED:
     # st.write('You are Searching for:',  st.session_state.text)
 
     # Load data and initialize session state
     if 'df' not in st.session_state:
-        with st.spinner(f'🔍 Fetching clinical trials data for 🤒: **{st.session_state.text}**'):
-            try:
-                st.session_state.df_ct = get_clinical_trials_data(st.session_state.text)
-                if st.session_state.df_ct is None or st.session_state.df_ct.empty:
-                    st.warning(f"⚠️ No clinical trials data found for '{st.session_state.text}'.")
-                    st.session_state.df_ct = None
-                else:
-                    st.success(f"✅ Clinical trials data fetched successfully for '{st.session_state.text}'!")
-            except Exception as e:
-                st.error(f"❌ Error fetching clinical trials data for '{st.session_state.text}': {e}")
-                st.session_state.df_ct = None
-    
-        with st.spinner(f"🔍 Fetching FDA Data for 💊: **{st.session_state.text}**"):
-            try:
-                st.session_state.df_fda = fetch_open_fda(domain=st.session_state.domain, keyword=st.session_state.text)
-                if st.session_state.df_fda is None or st.session_state.df_fda.empty:
-                    st.warning(f"⚠️ No FDA data found for '{st.session_state.text}'.")
-                    st.session_state.df_fda = None
+        keyword = st.session_state.text
+        # Both sources load at the same time; each reports as soon as it finishes, so a slow
+        # or failing source does not hold back the other
+        ct_status = st.empty()
+        fda_status = st.empty()
+        ct_status.info(f'🔍 Fetching clinical trials data for 🤒: **{keyword}**')
+        fda_status.info(f"🔍 Fetching FDA Data for 💊: **{keyword}**")
+        st.session_state.df_ct = None
+        st.session_state.df_fda = None
+        st.session_state.fda_lazy = None
+        # The shared cached results the session's copies come from; sandbox exports are keyed by them
+        st.session_state.data_source = {}
+
+        # Workers only fetch; Streamlit calls stay on this thread
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            futures = {
+                executor.submit(fetch_clinical_trials, keyword): 'ct',
+                executor.submit(fetch_open_fda, domain=st.session_state.domain, keyword=keyword): 'fda',
+            }
+            for future in as_completed(futures):
+                if futures[future] == 'ct':
+                    try:
+                        result = future.result()
+                        df_ct, ct_tables, ct_lookup = result
+                        st.session_state.ct_lookup = copy_lookups(ct_lookup)
+                        st.session_state.data_source['ct'] = result
+                        st.session_state.df_ct = df_ct.copy(deep=False) if df_ct is not None else None
+                        st.session_state.ct_tables = {name: table.copy(deep=False) for name, table in ct_tables.items()}
+                        if st.session_state.df_ct is None or st.session_state.df_ct.empty:
+                            ct_status.warning(f"⚠️ No clinical trials data found for '{keyword}'.")
+                            st.session_state.df_ct = None
+                        else:
+                            ct_status.success(f"✅ Clinical trials data fetched successfully for '{keyword}'!")
+                    except Exception as e:
+                        ct_status.error(f"❌ Error fetching clinical trials data for '{keyword}': {e}")
+                        st.session_state.df_ct = None
                 else:
-                    st.success(f"✅ FDA drug data fetched successfully for '{st.session_state.text}'!")
-            except Exception as e:
-                st.error(f"❌ Error fetching FDA data for '{st.session_state.text}': {e}")
-                st.session_state.df_fda = None
+                    try:
+                        result = future.result()
+                        df_fda, st.session_state.fda_lazy = result
+                        st.session_state.data_source['fda'] = result
+                        st.session_state.df_fda = df_fda.copy(deep=False) if df_fda is not None else None
+                        if st.session_state.df_fda is None or st.session_state.df_fda.empty:
+                            fda_status.warning(f"⚠️ No FDA data found for '{keyword}'.")
+                            st.session_state.df_fda = None
+                            st.session_state.fda_lazy = None
+                        else:
+                            fda_status.success(f"✅ FDA drug data fetched successfully for '{keyword}'!")
+                    except Exception as e:
+                        fda_status.error(f"❌ Error fetching FDA data for '{keyword}': {e}")
+                        st.session_state.df_fda = None
+                        st.session_state.fda_lazy = None
+
+        # Full-text indexes over the narrative columns, rebuilt whenever the data is (re)loaded.
+        # Sandbox workers build their own, so this process only needs one without them
+        st.session_state.text_index = None
+        if sandbox_pool is None:
+            st.session_state.text_index = TextIndex()
+            st.session_state.text_index.register('clinical_trials_df', st.session_state.df_ct)
+            st.session_state.text_index.register('FDA_drugs_df', st.session_state.df_fda, lazy=st.session_state.fda_lazy)
 
         # st.session_state.context_ct = clinical_trial_context
         # st.session_state.context_fda = fda_context
         st.session_state.messages = []
         st.session_state.df = True
 
+    with st.sidebar.expander("Data cache"):
+        st.json(data_cache.stats())
+    with st.sidebar.expander("Code cache"):
+        st.json(get_code_cache().stats())
+    if sandbox_pool is not None:
+        with st.sidebar.expander("Sandbox"):
+            st.json(sandbox_pool.stats())
+
     #Display the dataframe
     if isinstance(st.session_state.df_ct, pd.DataFrame):
         st.write('Data Sample: Top 10 rows from the clinical trials data')
@@ -134,314 +209,21 @@ if st.session_state.CONNECTED:
         with st.chat_message("user"):
             st.markdown(prompt)
 
-        llm = ChatOpenAI(model="gpt-4o")
-
-        # Prepare the graph state
-        class MessageState(TypedDict):
-            messages:Annotated[list[AnyMessage], add_messages]
-            code: str
-            result: str
-            retry_count: int
-            next: str
-            dfs: list[str]
-            out_df: any
-            summary: str
-            last_df_name: str
-            pass
-
-        class df_selection(TypedDict):
-            """Dataframe selection: Choose one or more dataframes to query from."""
-            df: list[Literal["clinical_trials_df", "FDA_drugs_df"]]  # Now df is a LIST
-
-        
-
-        def select_dataframe(state: MessageState) -> Command[Literal["generate_code"]]:
-            """Dataframe selection node: Choose the dataframe(s) to query from."""
-
-            dataframes = ["clinical_trials_df", "FDA_drugs_df"]
-
-            df_selection_prompt = f"""Your task is to select relevant dataframes from {dataframes} based on the user query: 
-                                    {state['messages'][-1]}. 
-                                    - Choose either one or both dataframes as needed.
-                                    - If the query requires information from both, return both in a list.
-            """
-
-            messages = [
-                {"role": "system", "content": df_selection_prompt},
-            ] + state["messages"]
-
-            response = llm.with_structured_output(df_selection).invoke(messages)
-
-            dfs = response["df"]
-
-            # Ensure dfs is always a list (even if the model returns a single string)
-            if isinstance(dfs, str):
-                dfs = [dfs]
-
-            return Command(goto="generate_code", update={"dfs": dfs})
-
-        # Define the workflow functions
-        def generate_code(state: MessageState) -> Command[Literal["agent"]]:
-            client = Groq(api_key=os.environ.get("GROQ_API_KEY"))
-            system_prompt = """Youa are a smart and intellegent heathcare Analyst. Your job is to Generate Python code that:
-            - Uses only provided variables
-            - Give the final dataframe from which answer to the query can be answered, and all the datafrmes in the code should have a suffix '_df
-            - Includes any necessary imports
-            - If fixing an error, correct the previous code while maintaining logic
-            - While matching any name lower the case for the term to search and in data where to search
-            - Also, try to use contains rather than exact match like ==
-            """
-
-            # Mapping of dataframe names to actual dataframes
-            df_mapping = {
-                "clinical_trials_df": st.session_state.df_ct,
-                "FDA_drugs_df": st.session_state.df_fda
-            }
-
-            # Ensure we get the actual dataframes from the selected names
-            data = [df_mapping[name] for name in state['dfs'] if name in df_mapping]
-            # print(f'The lenth of data is: {len(data)}')
-
-            if len(data)==1:
-                # Determine the available variables
-                available_variables = (
-                    list(data.columns) if isinstance(data, pd.DataFrame) else
-                    (list(data.keys()) if isinstance(data, dict) else 'N/A')
-                )
-                if state['dfs'][0] =='clinical_trials_df':
-                    data_context = clinical_trial_context
-                elif state['dfs'][0] == 'FDA_drugs_df':
-                    data_context = fda_context
-
-            else:
-                data_context = fda_context + clinical_trial_context
-                # Extract column names from each dataframe
-                available_variables = {
-                    name: list(df.columns) for name, df in zip(state['dfs'], data) if isinstance(df, pd.DataFrame)
-                }
-
-            # available_variables = list(st.session_state.df.columns)
-
-            user_message =  f"""{data_context}
-                Available variables: {available_variables}
-                Dataframes available: {state['dfs']}
-                Task: {state['messages'][-1]}"""
-
-
-            # Error-based rectification request
-            user_message_rectify = f"""The previous code:
-                {state['code'] if isinstance(state.get('code'), str) else 'N/A'}
-
-                gave the following error:
-                {state['result']['error'] if isinstance(state.get('result', {}).get('error'), str) else 'N/A'}
-
-
-                Based on the task: {state['messages'][-1]} and available variables: {available_variables},
-                please fix the error while maintaining the original logic."""
-
-            # Choose the correct prompt based on whether there's an error
-            selected_message = user_message if not state.get('error') else user_message_rectify
-
-            # chat_completion = client.chat.completions.create(
-            #     messages=[
-            #         {"role": "system", "content": system_prompt},
-            #         {"role": "user", "content": selected_message}
-            #     ],
-            #     model="deepseek-r1-distill-llama-70b",
-            #     temperature=0.1,
-            # )
-
-            messages = [
-                        {
-                            "role": "system",
-                            "content":  system_prompt,
-                        },
-                        {
-                            "role": "user",
-                            "content": selected_message,
-                        }
-                    ]
-            summary = llm.invoke(messages)
-            response = summary.content
-
-            def clean_code_response(response):
-                response = re.sub(r'<think>.*?</think>', '', response, flags=re.DOTALL)
-                code_match = re.search(r'```python\n(.*?)```', response, flags=re.DOTALL)
-                return code_match.group(1).strip() if code_match else response.strip()
-
-            # response = chat_completion.choices[0].message.content
-            return Command(
-                update={'code': clean_code_response(response)},
-                goto= "agent"
-            )
-
-        def agent(state: MessageState) -> Command[Literal["summarize_result", "__end__"]]:
-            # Access global variables safely
-            data = state['dfs']
-
-            # Check for the correct string values
-            if data[0] == "clinical_trials_df":
-                data_df = st.session_state.df_ct
-            elif data[0] == "FDA_drugs_df":
-                data_df = st.session_state.df_fda
-            else:
-                # Use a dictionary to store both DataFrames
-                data_df = {
-                    "clinical_trials_df": st.session_state.df_ct,
-                    "FDA_drugs_df": st.session_state.df_fda
-                }
-
-
-            def execute_python(code, data=None):
-                """Executes Python code with given context and prevents pandas truncation"""
-
-                # Set pandas display options
-                pd.set_option('display.max_rows', None)
-                pd.set_option('display.max_columns', None)
-                pd.set_option('display.width', None)
-                pd.set_option('display.max_colwidth', None)
-
-                old_stdout = sys.stdout
-                sys.stdout = StringIO()
-
-                # Ensure df is correctly assigned in the local scope
-                local_vars = {"df": data_df} if isinstance(data_df, pd.DataFrame) else data_df
-
-                local_vars = {'pd': pd,
-                              '__builtins__': __builtins__
-                            }
-                
-                if "clinical_trials_df" in data:
-                    local_vars["clinical_trials_df"] = st.session_state.df_ct
-                if "FDA_drugs_df" in data:
-                    local_vars["FDA_drugs_df"] = st.session_state.df_fda
-
-
-                try:
-                    # Store initial variables
-                    initial_vars = set(local_vars.keys())
-
-                    exec(code, local_vars)
-
-                    # Find all new DataFrame variables
-                    new_vars = set(local_vars.keys()) - initial_vars
-                    df_vars = {var: local_vars[var] for var in new_vars 
-                            if isinstance(local_vars[var], pd.DataFrame)}
-                    
-                    # Get the last DataFrame created (if any exist)
-                    result_df = None
-                    if df_vars:
-                        # Get the last DataFrame from the execution
-                        # last_df_name = list(df_vars.keys())[-1]
-                        # last_df_name= max(df_vars, key=lambda var: list(local_vars.keys()).index(var)) # Get the last created DF
-                        last_df_name = re.findall(r'\b\w+_df\b', code)[-1]
-                        result_df = df_vars[last_df_name]
-                        print(f"\nCapturing DataFrame: '{last_df_name}'")
-
-
-                    output = sys.stdout.getvalue()
-                    return {
-                            "output": output,
-                            "error": None,
-                            "result_df": result_df,
-                            "all_dataframes": df_vars,  # Optional: return all DataFrames if needed
-                            "last_df_name": last_df_name
-                        }
-                except Exception as e:
-                    error_trace = traceback.format_exc()
-                    return {
-                        "output": None,
-                        "error": str(error_trace),
-                        "result_df": None,
-                        "all_dataframes": {},
-                        "last_df_name":None
-                    }
-                finally:
-                    # Reset stdout and pandas options
-                    sys.stdout = old_stdout
-                    pd.reset_option('display.max_rows')
-                    pd.reset_option('display.max_columns')
-                    pd.reset_option('display.width')
-                    pd.reset_option('display.max_colwidth')
-
-            result = execute_python(state['code'], data)
-            # return {"result": result}
-            # Initialize retry count if not present
-            retry_count = state.get("retry_count", 0)
-            # st.write(f"This type of result: {type(result['output'])}")
-            
-            error = result.get("error", None)
-            if error:
-                # retry_count=1
-                st.write(f"Got erorr in the code, Number of retries : {retry_count + 1}.")
-                if retry_count < 3:
-                    retry_count += 1
-                    goto_agent = "generate_code"  # Retry code generation
-                else:
-                    goto_agent = END
-                    st.write("Max retries reached. Stopping.")
-            else:
-                goto_agent = "summarize_result"
-
-      
-            return Command(
-                    update={"result": result,
-                            "out_df": result['result_df'],
-                            "last_df_name":result['last_df_name'],
-                            "retry_count": retry_count,
-                            },          
-                    goto= goto_agent
-                )
-
-        def summarize_result(state: MessageState) -> Command[Literal[ "__end__"]]:
-            """Summarize the result of the code execution to human understable language"""
-            summarize_prompt = f"""Write the answer to the query from the output and ONLY IF REQUIRED to anser take help of DATA
-                                - The audience is experts in lifesciences and healthcare sector
-                                - The answer must provide clarity
-                                - Query: {state['messages'][-1]}
-                                - Output: {state['result']['output']}
-                                - Data: {state['out_df']}
-                                """
-
-            llm = ChatOpenAI(model="gpt-4o",  max_tokens=None)
-
-            messages = [
-                (
-                    "system",
-                    "You are a good at answering and summarizing results. Summarize results of data based on the user's query.",
-                ),
-                ("human", summarize_prompt),
-            ]
-
-            summary = llm.invoke(messages)
-            summary_text = summary.content
-            
-            return Command(
-                update={"summary": summary_text},
-                goto= END,
-            )
-
-        # Build and run the graph
-        builder = StateGraph(MessageState)
-        builder.add_edge(START, "select_dataframe")
-        builder.add_node("select_dataframe", select_dataframe)
-        builder.add_node("generate_code", generate_code)
-        builder.add_node("agent", agent)
-        builder.add_node("summarize_result", summarize_result)
-        graph = builder.compile()
-
-        # Invoke the graph
-        answer = graph.invoke({
-                    "messages": [HumanMessage(content=prompt)],
-                    "code": "",
-                    "result": {},
-                    "retry_count": 0,  # Initialize retry count
-                    "next": "",  # Define the next step (empty for now)
-                    "dfs": [],  # Initialize as an empty list
-                    "out_df": None, # Initialize out_df to None or an empty DataFrame
-                    "summary": "",
-                    "last_df_name":"",  
-                })
+        # The graph and LLM clients are built once per process; this session's data is passed per run
+        session = SessionData(
+            df_ct=st.session_state.df_ct,
+            df_fda=st.session_state.df_fda,
+            ct_tables=st.session_state.get('ct_tables', {}),
+            ct_lookup=st.session_state.get('ct_lookup', {}),
+            fda_lazy=st.session_state.get('fda_lazy'),
+            text_index=st.session_state.text_index,
+            drug_synonyms=drug_synonyms,
+            code_cache=get_code_cache(),
+            sandbox=sandbox_pool,
+            data_source=st.session_state.get('data_source'),
+            notify=st.write,
+        )
+        answer = run_question(prompt, session)
 
         # Display assistant response
         # response = answer['result']['output'] if answer['result'].get('output') else f"Error: {answer['result']['output'].get('error')}"
@@ -451,6 +233,8 @@ if st.session_state.CONNECTED:
 
         # Display assistant response
         with st.chat_message("assistant"):
+            if answer.get('cache_hit'):
+                st.caption(f"♻️ Reused code from an earlier question ({answer['cache_entry'].successes} successful runs)")
             # Always show generated code
             # st.code(answer.get('code', ''), language='python')
             with st.expander("View Code"):
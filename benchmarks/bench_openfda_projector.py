@@ -0,0 +1,75 @@
+"""Throughput of the openFDA label projection, before and after the compiled projector.
+
+Run against a recorded 1000-label response:
+
+    python benchmarks/bench_openfda_projector.py --record labels.json   # fetch and save once
+    python benchmarks/bench_openfda_projector.py labels.json
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from http_client import get_http_client, json_loads  # noqa: E402
+from openfda import Open_FDA  # noqa: E402
+
+RECORD_URL = 'https://api.fda.gov/drug/label.json?search=indications_and_usage:"hypertension"&limit=1000'
+
+
+def legacy_clean_openfda_value(openfda_value):
+    clean_list = list(set(openfda_value))
+    clean_list = [str(item) for item in clean_list]
+    return "/".join(clean_list)
+
+
+def legacy_extract(results, needed_column_names):
+    """The per-key loop open_fda_data used before the projector."""
+    api_data = []
+    for current_data in results:
+        api_unit_data = {}
+        for key, value in current_data.items():
+            if key == "openfda":
+                for openfda_key, openfda_value in value.items():
+                    if openfda_key in needed_column_names:
+                        api_unit_data[openfda_key] = legacy_clean_openfda_value(openfda_value)
+            elif key in needed_column_names:
+                api_unit_data[key] = legacy_clean_openfda_value(value)
+        api_data.append(api_unit_data)
+    return api_data
+
+
+def best_of(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("response", help="Path of a recorded openFDA label response (JSON)")
+    parser.add_argument("--record", action="store_true", help=f"Fetch {RECORD_URL} into the path first")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.record:
+        with open(args.response, "wb") as f:
+            f.write(get_http_client().get(RECORD_URL).content)
+
+    with open(args.response, "rb") as f:
+        results = json_loads(f.read())["results"]
+
+    needed = Open_FDA.needed_column_names
+    legacy = best_of(lambda: legacy_extract(results, needed), args.repeat)
+    compiled = best_of(lambda: Open_FDA.project_records(results), args.repeat)
+    print(f"{len(results)} labels")
+    print(f"before (per-key loop + set dedupe): {len(results) / legacy:,.0f} labels/s")
+    print(f"after  (compiled projector):        {len(results) / compiled:,.0f} labels/s  ({legacy / compiled:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Per-message setup overhead of the chat workflow: rebuilt every message vs built once per process.
+
+    python benchmarks/bench_workflow_setup.py --repeat 50
+
+No API calls are made; a placeholder OPENAI_API_KEY/GROQ_API_KEY is set if missing
+so the clients can be constructed.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "sk-placeholder")
+os.environ.setdefault("GROQ_API_KEY", "gsk-placeholder")
+
+from groq import Groq  # noqa: E402
+from langchain_openai import ChatOpenAI  # noqa: E402
+
+import workflow  # noqa: E402
+
+
+def per_message_setup():
+    """What the app did for every chat message before: new clients and a freshly compiled graph."""
+    ChatOpenAI(model="gpt-4o")  # graph-level llm
+    Groq(api_key=os.environ.get("GROQ_API_KEY"))  # generate_code
+    ChatOpenAI(model="gpt-4o", max_tokens=None)  # summarize_result
+    workflow.build_graph()
+
+
+def shared_setup():
+    """What the app does now: look up the process-wide graph and clients."""
+    workflow.get_graph()
+    workflow.get_llm(model="gpt-4o")
+    workflow.get_llm(model="gpt-4o", max_tokens=None)
+
+
+def mean_ms(func, repeat):
+    func()  # warm-up: imports, first build of the shared objects
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    before = mean_ms(per_message_setup, args.repeat)
+    after = mean_ms(shared_setup, args.repeat)
+    print(f"per-message setup before: {before:.2f} ms")
+    print(f"per-message setup after:  {after:.4f} ms  (saves {before - after:.2f} ms per message)")
+
+
+if __name__ == "__main__":
+    main()
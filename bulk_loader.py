@@ -0,0 +1,119 @@
+import argparse
+import os
+import zipfile
+from datetime import date
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from clinical_trials_module import normalize_study, study_children
+from http_client import get_http_client, json_loads
+from study_store import DEFAULT_STORE_PATH, StudyStore
+
+DUMP_URL = "https://clinicaltrials.gov/api/v2/studies/download?format=json.zip"
+
+
+def download_dump(path, client=None, url=DUMP_URL, chunk_size=1 << 20):
+    """
+    Stream the ClinicalTrials.gov all-studies JSON archive to ``path``.
+
+    Returns:
+        str: The path of the downloaded zip file.
+    """
+    client = client or get_http_client()
+    with client.session.get(url, stream=True, timeout=client.timeout) as response:
+        response.raise_for_status()
+        with open(path, "wb") as f:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                f.write(chunk)
+    return path
+
+
+def iter_zip_batches(zip_path, batch_size=500):
+    """Yield lists of raw per-study JSON documents read straight from the archive, without extracting it."""
+    with zipfile.ZipFile(zip_path) as archive:
+        batch = []
+        for info in archive.infolist():
+            if info.is_dir() or not info.filename.endswith(".json"):
+                continue
+            with archive.open(info) as member:
+                batch.append(member.read())
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+def archive_date(zip_path):
+    """Return the date of the newest file in the archive as YYYY-MM-DD."""
+    with zipfile.ZipFile(zip_path) as archive:
+        return date(*max(info.date_time for info in archive.infolist())[:3]).isoformat()
+
+
+def _normalize_batch(documents):
+    """Worker: decode and flatten a batch of raw studies into (rows, children)."""
+    studies = [json_loads(document) for document in documents]
+    return [normalize_study(study) for study in studies], [study_children(study) for study in studies]
+
+
+def bulk_import(zip_path, store=None, workers=None, batch_size=500):
+    """
+    Import a ClinicalTrials.gov JSON dump into a StudyStore using a process pool.
+
+    Batches of studies are read from the zip in the main process, flattened by
+    the same normalize_study/study_children code in worker processes and
+    written to the store as they complete. At most two batches per worker are
+    in flight, so memory stays bounded regardless of the archive size.
+
+    The store is marked with the dump's snapshot date: the newest
+    lastUpdatePostDate among the imported studies, or the date of the
+    archive's newest file if no study carries one. Later delta syncs start
+    from it, not from the day of the import.
+
+    Args:
+        zip_path (str): Path of the downloaded all-studies JSON zip.
+        store (StudyStore, optional): Target store. Defaults to StudyStore() at the default path.
+        workers (int, optional): Worker processes. Defaults to os.cpu_count().
+        batch_size (int, optional): Studies per task. Defaults to 500.
+
+    Returns:
+        int: The number of studies imported.
+    """
+    store = store or StudyStore()
+    workers = workers or os.cpu_count() or 1
+    imported, latest = 0, None
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        for batch in iter_zip_batches(zip_path, batch_size):
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                imported, latest = _store_results(store, done, imported, latest)
+            pending.add(executor.submit(_normalize_batch, batch))
+        imported, latest = _store_results(store, pending, imported, latest)
+    store.mark_bulk_import(latest or archive_date(zip_path))
+    print(f"Imported {imported} studies into {store.path}")
+    return imported
+
+
+def _store_results(store, futures, imported, latest):
+    # Returns the running (study count, newest lastUpdatePostDate)
+    for future in futures:
+        rows, children = future.result()
+        store.upsert(rows, children=children)
+        imported += len(rows)
+        dates = [row["lastUpdatePostDate"] for row in rows if row.get("lastUpdatePostDate")]
+        if dates:
+            latest = max(latest or "", max(dates))
+    return imported, latest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import the ClinicalTrials.gov full JSON dump into the local study store.")
+    parser.add_argument("zip_path", help="Path of the all-studies JSON zip (downloaded first with --download)")
+    parser.add_argument("--download", action="store_true", help=f"Download the archive from {DUMP_URL} first")
+    parser.add_argument("--store", default=DEFAULT_STORE_PATH, help="SQLite store path")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    args = parser.parse_args()
+
+    if args.download:
+        download_dump(args.zip_path)
+    bulk_import(args.zip_path, StudyStore(args.store), workers=args.workers)
@@ -1,172 +1,642 @@
 import requests
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 from dateutil.parser import parse
 from dateutil.parser import ParserError  
+from http_client import get_http_client
 
-def get_clinical_trials_data(COND):
-    base_url = "https://clinicaltrials.gov/api/v2/studies"
+BASE_URL = "https://clinicaltrials.gov/api/v2/studies"
+PAGE_SIZE = 1000
+DATE_COLUMNS = ['statusVerifiedDate','startDate', 'completionDate', 'studyFirstSubmitDate', 'studyFirstPostDate', 'lastUpdatePostDate']
+
+
+class PaginationError(Exception):
+    """Raised when a result page cannot be fetched after all retries.
+
+    ``page_token`` is the token of the page that failed (None for the first page),
+    so the download can be resumed with ``iter_clinical_trials_pages(COND, page_token=...)``.
+    """
+
+    def __init__(self, message, page_token, pages_fetched):
+        super().__init__(message)
+        self.page_token = page_token
+        self.pages_fetched = pages_fetched
+
+
+def _fetch_page(client, base_url, params):
+    """Download and decode one result page through the shared HTTP client."""
+    return client.get_json(base_url, params=params)
+
+
+def iter_clinical_trials_pages(COND, prefetch=True, page_token=None, client=None, base_url=BASE_URL,
+                               advanced_filter=None):
+    """Yield the list of raw studies of each result page as soon as it is downloaded.
+
+    Only one page is referenced at a time, so the caller can normalize it and let
+    the raw JSON be garbage collected before the next page arrives. With
+    ``prefetch`` enabled, page N+1 is requested on a background thread as soon as
+    its token is known, so the download overlaps with the caller processing page N.
+
+    Transient HTTP failures are retried by the shared client. If a page still
+    cannot be fetched a PaginationError carrying the last good page token is
+    raised instead of silently returning partial data; pass that token back as
+    ``page_token`` to resume.
+
+    ``advanced_filter`` is sent as ``filter.advanced`` (Essie syntax), e.g.
+    ``AREA[LastUpdatePostDate]RANGE[2024-01-01,MAX]`` to fetch only recent updates.
+    """
+    client = client or get_http_client()
     params = {
         "query.term": str(COND),
-        "pageSize": 1000,
-        "pageToken": None  # Set initial page token to None
+        "pageSize": PAGE_SIZE,
+        "fields": build_fields_projection(),  # Only download what normalize_study reads
+        "pageToken": page_token  # None starts from the first page
     }
+    if advanced_filter:
+        params["filter.advanced"] = advanced_filter
 
-    all_studies = {}
-    i = 0
-    while True:
-        response = requests.get(base_url, params=params)
-        
-        if response.status_code == 200:
-            data = response.json()
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ct-prefetch")
+    try:
+        pending = executor.submit(_fetch_page, client, base_url, dict(params))
+        i = 0
+        while pending is not None:
+            try:
+                data = pending.result()
+            except requests.exceptions.RequestException as e:
+                raise PaginationError(f"Error fetching data: {e}", params['pageToken'], i) from e
             studies = data.get("studies", [])
-            
-            if i == 0:
-                all_studies.update(data)  # Add the studies from this page to the dictionary
-                page_token = data.get("nextPageToken")
-            elif i > 0:
-                # Extend the studies list with new studies
-                all_studies["studies"].extend(data.get("studies", []))
-                page_token = data.get("nextPageToken")
+            page_token = data.get("nextPageToken")
+            del data
+
+            pending = None
+            if page_token:
+                params['pageToken'] = page_token  # Set the page token for the next request
+                if prefetch:
+                    pending = executor.submit(_fetch_page, client, base_url, dict(params))
+
+            yield studies
+
             if not page_token:
                 break  # Exit the loop when there are no more pages
-            params['pageToken'] = page_token  # Set the page token for the next request
+            if pending is None:
+                pending = executor.submit(_fetch_page, client, base_url, dict(params))
             i += 1
             print(f"Page {i} processed")
+    finally:
+        # Do not block on an in-flight prefetch if the consumer stopped early
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Declarative flattening spec. Each column reads one API path and optionally
+# passes the value through a reducer for list-valued fields. The spec is
+# compiled once into straight-line extractor functions (see _compile), and the
+# page requests only ask for the paths it reads (see build_fields_projection),
+# so adding a column here or via register_column extends both automatically.
+_ID = 'protocolSection.identificationModule'
+_STATUS = 'protocolSection.statusModule'
+_SPONSOR = 'protocolSection.sponsorCollaboratorsModule'
+_DESCRIPTION = 'protocolSection.descriptionModule'
+_DESIGN = 'protocolSection.designModule'
+_ARMS = 'protocolSection.armsInterventionsModule'
+_OUTCOMES = 'protocolSection.outcomesModule'
+_ELIGIBILITY = 'protocolSection.eligibilityModule'
+_LOCATIONS = 'protocolSection.contactsLocationsModule.locations'
+
+class Reducer:
+    """Turns the list found at a column's path into the cell value.
+
+    ``template`` is a Python expression over the list variable ``{v}`` that is
+    inlined into the compiled extractors, ``subfields`` are the keys it reads
+    from the list items (used for the request projection), and ``keeps_null``
+    makes an explicit null list produce a null cell instead of an empty string.
+    """
+
+    def __init__(self, template, subfields=(), keeps_null=False):
+        self.template = template
+        self.subfields = tuple(subfields)
+        self.keeps_null = keeps_null
+
+    def code(self, var):
+        return self.template.format(v=var)
+
+
+def join(sep=', '):
+    """Join a list of strings."""
+    return Reducer(f'{sep!r}.join({{v}})')
+
+
+def join_field(key, sep=', '):
+    """Join one field of a list of objects."""
+    return Reducer(f'{sep!r}.join([x.get({key!r}) for x in {{v}}])', [key])
+
+
+def set_join_field(key, sep=', '):
+    """Join the distinct values of one field of a list of objects; a null list stays null."""
+    return Reducer(f"(None if {{v}} is None else {sep!r}.join({{{{x.get({key!r}) or '' for x in {{v}}}}}}))",
+                   [key], keeps_null=True)
+
+
+def set_join_nested(key, sep=', '):
+    """Join the distinct values of a list field across a list of objects."""
+    return Reducer(f'{sep!r}.join({{{{y for x in {{v}} for y in x.get({key!r}, [])}}}})', [key])
+
+
+def filter_by_type(include=None, exclude=None, sep=', '):
+    """Join the names of the objects whose lower-cased type is (or is not) in the given list."""
+    test = f'in {tuple(include)!r}' if include is not None else f'not in {tuple(exclude)!r}'
+    return Reducer(f"{sep!r}.join([x.get('name', '') for x in {{v}} if x.get('type', '').lower() {test}])",
+                   ['name', 'type'])
+
+
+def format_join(template, keys, sep='\n'):
+    """Format each object with ``template`` (missing keys become '') and join the results."""
+    arguments = ', '.join(f"{key}=x.get({key!r}, '')" for key in keys)
+    literal = repr(template).replace('{', '{{').replace('}', '}}')
+    return Reducer(f'{sep!r}.join([{literal}.format({arguments}) for x in {{v}}])', keys)
+
+
+def enumerate_format(label, key, sep='\n'):
+    """Number each object as '<label> <n>: <key value>' and join the results."""
+    return Reducer(f"{sep!r}.join([{label + ' '!r} + str(i + 1) + ': ' + str(x.get({key!r}) or 'None') "
+                   f"for i, x in enumerate({{v}})])", [key])
+
+
+STUDY_COLUMNS = [
+    # Identification module
+    ('nctId', f'{_ID}.nctId', None),
+    ('organization', f'{_ID}.organization.fullName', None),
+    ('organizationType', f'{_ID}.organization.class', None),
+    ('briefTitle', f'{_ID}.briefTitle', None),
+    ('officialTitle', f'{_ID}.officialTitle', None),
+    # Status module
+    ('statusVerifiedDate', f'{_STATUS}.statusVerifiedDate', None),
+    ('overallStatus', f'{_STATUS}.overallStatus', None),
+    ('hasExpandedAccess', f'{_STATUS}.expandedAccessInfo.hasExpandedAccess', None),
+    ('startDate', f'{_STATUS}.startDateStruct.date', None),
+    ('completionDate', f'{_STATUS}.completionDateStruct.date', None),
+    ('completionDateType', f'{_STATUS}.completionDateStruct.type', None),
+    ('studyFirstSubmitDate', f'{_STATUS}.studyFirstSubmitDate', None),
+    ('studyFirstPostDate', f'{_STATUS}.studyFirstPostDateStruct.date', None),
+    ('lastUpdatePostDate', f'{_STATUS}.lastUpdatePostDateStruct.date', None),
+    ('lastUpdatePostDateType', f'{_STATUS}.lastUpdatePostDateStruct.type', None),
+    # Results status
+    ('HasResults', 'hasResults', None),
+    # Sponsor collaborators module
+    ('responsibleParty', f'{_SPONSOR}.responsibleParty.oldNameTitle', None),
+    ('leadSponsor', f'{_SPONSOR}.leadSponsor.name', None),
+    ('leadSponsorType', f'{_SPONSOR}.leadSponsor.class', None),
+    ('collaborators', f'{_SPONSOR}.collaborators', join_field('name')),
+    ('collaboratorsType', f'{_SPONSOR}.collaborators', join_field('class')),
+    # Description module
+    ('briefSummary', f'{_DESCRIPTION}.briefSummary', None),
+    ('detailedDescription', f'{_DESCRIPTION}.detailedDescription', None),
+    # Conditions module
+    ('conditions', 'protocolSection.conditionsModule.conditions', join()),
+    # Design module
+    ('studyType', f'{_DESIGN}.studyType', None),
+    ('phases', f'{_DESIGN}.phases', join()),
+    ('allocation', f'{_DESIGN}.designInfo.allocation', None),
+    ('interventionModel', f'{_DESIGN}.designInfo.interventionModel', None),
+    ('primaryPurpose', f'{_DESIGN}.designInfo.primaryPurpose', None),
+    ('masking', f'{_DESIGN}.designInfo.maskingInfo.masking', None),
+    ('whoMasked', f'{_DESIGN}.designInfo.maskingInfo.whoMasked', join()),
+    ('enrollmentCount', f'{_DESIGN}.enrollmentInfo.count', None),
+    ('enrollmentType', f'{_DESIGN}.enrollmentInfo.type', None),
+    # Arms interventions module
+    ('arms', f'{_ARMS}.armGroups', join_field('label')),
+    ('interventions', f'{_ARMS}.armGroups', set_join_nested('interventionNames')),
+    ('interventionDrug', f'{_ARMS}.interventions', filter_by_type(include=['drug'])),
+    ('interventionBiological', f'{_ARMS}.interventions', filter_by_type(include=['biological'])),
+    ('interventioOthers', f'{_ARMS}.interventions', filter_by_type(exclude=['drug', 'biological'])),
+    ('interventionDescription', f'{_ARMS}.interventions', format_join('{name}: {description}', ['name', 'description'])),
+    # Outcomes module
+    ('primaryOutcomes', f'{_OUTCOMES}.primaryOutcomes', enumerate_format('Primary Outcome', 'measure')),
+    ('secondaryOutcomes', f'{_OUTCOMES}.secondaryOutcomes', enumerate_format('Secondary Outcome', 'measure')),
+    # Eligibility module
+    ('eligibilityCriteria', f'{_ELIGIBILITY}.eligibilityCriteria', None),
+    ('healthyVolunteers', f'{_ELIGIBILITY}.healthyVolunteers', None),
+    ('eligibilityGender', f'{_ELIGIBILITY}.sex', None),
+    ('eligibilityMinimumAge', f'{_ELIGIBILITY}.minimumAge', None),
+    ('eligibilityMaximumAge', f'{_ELIGIBILITY}.maximumAge', None),
+    ('eligibilityStandardAges', f'{_ELIGIBILITY}.stdAges', None),
+    # Locations
+    ('LocationName', _LOCATIONS, set_join_field('facility')),
+    ('city', _LOCATIONS, set_join_field('city')),
+    ('state', _LOCATIONS, set_join_field('state')),
+    ('country', _LOCATIONS, set_join_field('country')),
+]
+
+# User-added columns: name -> (fields, function(study) -> value), see register_column
+EXTRA_COLUMNS = {}
+
+_compiled = None
+
+
+def register_column(name, fields, extractor):
+    """Add a custom column to the normalized trials data.
+
+    Args:
+        name (str): The column name.
+        fields (list): API field paths the extractor reads, e.g.
+            ['protocolSection.designModule.keywords']. They are added to the
+            request projection automatically.
+        extractor (callable): Function taking the raw study dict and returning the cell value.
+    """
+    global _compiled
+    EXTRA_COLUMNS[name] = (list(fields), extractor)
+    _compiled = None
+
+
+def column_fields():
+    """Return the API field paths read for each column, including registered ones."""
+    fields = {}
+    for name, path, reducer in STUDY_COLUMNS:
+        subfields = getattr(reducer, 'subfields', ())
+        fields[name] = [f'{path}.{key}' for key in subfields] if subfields else [path]
+    for name, (paths, _) in EXTRA_COLUMNS.items():
+        fields[name] = paths
+    return fields
+
+
+def build_fields_projection(columns=None):
+    """Build the ``fields=`` parameter for the studies endpoint from the column spec.
+
+    Paths already covered by a requested parent path are dropped, so the
+    projection stays as short as possible.
+    """
+    fields = column_fields()
+    if columns is not None:
+        fields = {column: fields[column] for column in columns}
+    paths = sorted({path for column_paths in fields.values() for path in column_paths})
+    kept = []
+    for path in paths:
+        if not any(path.startswith(parent + '.') for parent in kept):
+            kept.append(path)
+    return ','.join(kept)
+
+
+def _compile():
+    """Generate the row and page extractors for STUDY_COLUMNS and EXTRA_COLUMNS.
+
+    Every intermediate object on a path, and every list shared by several
+    reducers, is looked up once per study; reducers are inlined as plain
+    expressions, and the page extractor appends straight into one list per
+    column instead of building a dict per study.
+    """
+    namespace = {'_EMPTY': {}}
+    nodes = {(): 'study'}
+    lists = {}
+    lines = []
+    expressions = []
+
+    def node(parts):
+        if parts not in nodes:
+            parent = node(parts[:-1])
+            nodes[parts] = f'n{len(nodes)}'
+            lines.append(f'{nodes[parts]} = {parent}.get({parts[-1]!r}) or _EMPTY')
+        return nodes[parts]
+
+    def list_value(parts, keeps_null):
+        key = (parts, keeps_null)
+        if key not in lists:
+            lists[key] = f'v{len(lists)}'
+            lookup = f'.get({parts[-1]!r}, ())' if keeps_null else f'.get({parts[-1]!r}) or ()'
+            lines.append(f'{lists[key]} = {node(parts[:-1])}{lookup}')
+        return lists[key]
+
+    for name, path, reducer in STUDY_COLUMNS:
+        parts = tuple(path.split('.'))
+        if reducer is None:
+            expressions.append((name, f'{node(parts[:-1])}.get({parts[-1]!r})'))
         else:
-            print(f"Error fetching data: {response.status_code}")
-            break  # Exit on error
-
-    def normalize_study(study):
-        flat_data = {}
-        
-        # Extract identification module
-        identification = study.get('protocolSection', {}).get('identificationModule', {})
-        flat_data['nctId'] = identification.get('nctId')
-        flat_data['organization'] = identification.get('organization', {}).get('fullName')
-        flat_data['organizationType'] = identification.get('organization', {}).get('class')
-        flat_data['briefTitle'] = identification.get('briefTitle')
-        flat_data['officialTitle'] = identification.get('officialTitle')
-        
-        # Extract status module
-        status = study.get('protocolSection', {}).get('statusModule', {})
-        flat_data['statusVerifiedDate'] = status.get('statusVerifiedDate')
-        flat_data['overallStatus'] = status.get('overallStatus')
-        flat_data['hasExpandedAccess'] = status.get('expandedAccessInfo', {}).get('hasExpandedAccess')
-        flat_data['startDate'] = status.get('startDateStruct', {}).get('date')
-        flat_data['completionDate'] = status.get('completionDateStruct', {}).get('date')
-        flat_data['completionDateType'] = status.get('completionDateStruct', {}).get('type')
-        flat_data['studyFirstSubmitDate'] = status.get('studyFirstSubmitDate')
-        flat_data['studyFirstPostDate'] = status.get('studyFirstPostDateStruct', {}).get('date')
-        flat_data['lastUpdatePostDate'] = status.get('lastUpdatePostDateStruct', {}).get('date')
-        flat_data['lastUpdatePostDateType'] = status.get('lastUpdatePostDateStruct', {}).get('type')
-
-        #Results status
-        flat_data['HasResults'] = study.get('hasResults')
-        
-        # Extract sponsor collaborators module
-        sponsor = study.get('protocolSection', {}).get('sponsorCollaboratorsModule', {})
-        flat_data['responsibleParty'] = sponsor.get('responsibleParty', {}).get('oldNameTitle')
-        flat_data['leadSponsor'] = sponsor.get('leadSponsor', {}).get('name')
-        flat_data['leadSponsorType'] = sponsor.get('leadSponsor', {}).get('class')
-        flat_data['collaborators'] = ', '.join([collab.get('name') for collab in sponsor.get('collaborators', [])])
-        flat_data['collaboratorsType'] = ', '.join([collab.get('class') for collab in sponsor.get('collaborators', [])])
-        
-        # Extract description module
-        description = study.get('protocolSection', {}).get('descriptionModule', {})
-        flat_data['briefSummary'] = description.get('briefSummary')
-        flat_data['detailedDescription'] = description.get('detailedDescription')
-        
-        # Extract conditions module
-        conditions = study.get('protocolSection', {}).get('conditionsModule', {})
-        flat_data['conditions'] = ', '.join(conditions.get('conditions', []))
-        
-        # Extract design module
-        design = study.get('protocolSection', {}).get('designModule', {})
-        flat_data['studyType'] = design.get('studyType')
-        flat_data['phases'] = ', '.join(design.get('phases', []))
-        flat_data['allocation'] = design.get('designInfo', {}).get('allocation')
-        flat_data['interventionModel'] = design.get('designInfo', {}).get('interventionModel')
-        flat_data['primaryPurpose'] = design.get('designInfo', {}).get('primaryPurpose')
-        flat_data['masking'] = design.get('designInfo', {}).get('maskingInfo', {}).get('masking')
-        flat_data['whoMasked'] = ', '.join(design.get('designInfo', {}).get('maskingInfo', {}).get('whoMasked', []))
-        flat_data['enrollmentCount'] = design.get('enrollmentInfo', {}).get('count')
-        flat_data['enrollmentType'] = design.get('enrollmentInfo', {}).get('type')
-        
-        # Extract arms interventions module
-        arms = study.get('protocolSection', {}).get('armsInterventionsModule', {}).get('armGroups', [])
-        flat_data['arms'] = ', '.join([arm.get('label') for arm in arms])
-        flat_data['interventions'] = ', '.join({intervention for arm in arms for intervention in arm.get('interventionNames', [])})
-
-         #interventions name
-        interventions = study.get('protocolSection', {}).get('armsInterventionsModule', {}).get('interventions', [])
-        flat_data['interventionDrug'] = ', '.join([intervention.get('name', '') for intervention in interventions 
-                                           if intervention.get('type', '').lower() == 'drug'])
-        flat_data['interventionBiological'] = ', '.join([intervention.get('name', '') for intervention in interventions 
-                                                        if intervention.get('type', '').lower() == 'biological'])
-        flat_data['interventioOthers'] = ', '.join([intervention.get('name', '') for intervention in interventions 
-                                                    if intervention.get('type', '').lower() not in ['drug', 'biological']])
-        flat_data['interventionDescription'] = '\n'.join([f"{intervention.get('name', '')}: {intervention.get('description', '')}" for intervention 
-                                                          in interventions])
-
-        # Extract the outcome module
-        outcome = study.get('protocolSection', {}).get('outcomesModule', {})
-        flat_data['primaryOutcomes'] = '\n'.join([
-                                                    f"Primary Outcome {i + 1}: {primary_outcome.get('measure', None) or 'None'}"
-                                                    for i, primary_outcome in enumerate(outcome.get('primaryOutcomes', []))
-                                                ])
-        flat_data['secondaryOutcomes'] = '\n'.join([
-                                                    f"Secondary Outcome {i + 1}: {primary_outcome.get('measure', None) or 'None'}"
-                                                    for i, primary_outcome in enumerate(outcome.get('secondaryOutcomes', []))
-                                                ])
-        #Extract Eligibility
-        eligibility = study.get('protocolSection',{}).get('eligibilityModule',{})
-        flat_data['eligibilityCriteria'] = eligibility.get('eligibilityCriteria')
-        flat_data['healthyVolunteers'] = eligibility.get('healthyVolunteers')
-        flat_data['eligibilityGender'] = eligibility.get('sex')
-        flat_data['eligibilityMinimumAge'] = eligibility.get('minimumAge')
-        flat_data['eligibilityMaximumAge'] = eligibility.get('maximumAge')
-        flat_data['eligibilityStandardAges'] = eligibility.get('stdAges')
-
-        #Extract the locations
-        locations = study.get('protocolSection',{}).get('contactsLocationsModule',{}).get('locations',{})
-        if locations is not None:
-            flat_data['LocationName'] = ', '.join(set(location.get('facility') or '' for location in locations)) if locations is not None else ''
-            flat_data['city'] = ', '.join(set(location.get('city') or '' for location in locations)) if locations is not None else '' 
-            flat_data['state'] = ', '.join(set(location.get('state') or '' for location in locations)) if locations is not None else '' 
-            flat_data['country'] = ', '.join(set(location.get('country') or '' for location in locations)) if locations is not None else '' 
-
-        return flat_data
-
-    # Normalize all studies
-    normalized_data = [normalize_study(study) for study in all_studies.get('studies', [])]
+            expressions.append((name, reducer.code(list_value(parts, reducer.keeps_null))))
+    for i, (name, (_, extractor)) in enumerate(EXTRA_COLUMNS.items()):
+        namespace[f'x{i}'] = extractor
+        expressions.append((name, f'x{i}(study)'))
 
-    # Convert to DataFrame
-    df = pd.DataFrame(normalized_data)
-
-    def parse_date(date_str):
-        if pd.isna(date_str):
-            return pd.NaT
-        if isinstance(date_str, list):
-            date_str = date_str[0] if date_str else None
-        if not date_str:
-            return pd.NaT
-        try:
-            # Parse the date, set day to 1 if only year and month are provided
-            parsed_date = parse(date_str, default=parse('2000-01-01'))
-            if len(date_str) <= 7:  # If only year or year-month is provided
-                return parsed_date.replace(day=1)
-            return parsed_date
-        except ParserError:
-            return pd.NaT
-
-    # Convert date columns
-    date_columns = ['statusVerifiedDate','startDate', 'completionDate', 'studyFirstSubmitDate', 'studyFirstPostDate', 'lastUpdatePostDate']
-    
-    for col in date_columns:
-        df[col] = df[col].apply(parse_date)
-    
+    names = [name for name, _ in expressions]
+    row_source = ['def normalize_study(study):']
+    row_source += [f'    {line}' for line in lines]
+    row_source.append('    return {' + ', '.join(f'{name!r}: {expr}' for name, expr in expressions) + '}')
+
+    page_source = ['def normalize_page(studies):']
+    page_source += [f'    c{i} = []; a{i} = c{i}.append' for i in range(len(expressions))]
+    page_source.append('    for study in studies:')
+    page_source += [f'        {line}' for line in lines]
+    page_source += [f'        a{i}({expr})' for i, (_, expr) in enumerate(expressions)]
+    page_source.append('    return {' + ', '.join(f'{name!r}: c{i}' for i, name in enumerate(names)) + '}')
+
+    exec('\n'.join(row_source + [''] + page_source), namespace)
+    return namespace['normalize_study'], namespace['normalize_page']
+
+
+def _extractors():
+    global _compiled
+    if _compiled is None:
+        _compiled = _compile()
+    return _compiled
+
+
+def normalize_study(study):
+    """Flatten one raw study into a dict of column values."""
+    return _extractors()[0](study)
+
+
+def normalize_page(studies):
+    """Flatten a list of raw studies into a dict of column lists in one pass."""
+    return _extractors()[1](studies)
+
+
+# Long-format companion tables for the multi-valued fields that the main frame
+# flattens into comma-joined strings: table -> (list path, item fields). A None
+# field list means the path holds plain strings, stored under the table's
+# singular name.
+CHILD_TABLES = {
+    'sites': (_LOCATIONS, ['facility', 'city', 'state', 'country']),
+    'interventions': (f'{_ARMS}.interventions', ['type', 'name']),
+    'conditions': ('protocolSection.conditionsModule.conditions', None),
+    'collaborators': (f'{_SPONSOR}.collaborators', ['name', 'class']),
+}
+
+# Lookup name -> (child table, column) indexed by build_lookups
+LOOKUP_COLUMNS = {
+    'facility': ('sites', 'facility'),
+    'city': ('sites', 'city'),
+    'state': ('sites', 'state'),
+    'country': ('sites', 'country'),
+    'intervention': ('interventions', 'name'),
+    'condition': ('conditions', 'condition'),
+    'collaborator': ('collaborators', 'name'),
+}
+
+
+def _child_columns(table):
+    fields = CHILD_TABLES[table][1]
+    return fields if fields is not None else [table[:-1]]
+
+
+def study_children(study):
+    """Return the child rows of one raw study as {table: [tuple, ...]} (without nctId)."""
+    children = {}
+    for table, (path, fields) in CHILD_TABLES.items():
+        items = study
+        for key in path.split('.'):
+            items = (items or {}).get(key)
+        items = items or []
+        if fields is None:
+            children[table] = [(item,) for item in items]
+        else:
+            children[table] = [tuple(item.get(field) for field in fields) for item in items]
+    return children
+
+
+def normalize_children(studies, buffers=None):
+    """Append the child rows of a page of raw studies to per-table ColumnBuffers.
+
+    Returns:
+        dict: table -> ColumnBuffer with an nctId column plus the table's fields.
+    """
+    buffers = buffers if buffers is not None else {table: ColumnBuffer() for table in CHILD_TABLES}
+    for study in studies:
+        nct_id = (study.get('protocolSection') or {}).get('identificationModule', {}).get('nctId')
+        add_children(buffers, nct_id, study_children(study))
+    return buffers
+
+
+def add_children(buffers, nct_id, children):
+    """Append the output of study_children for one study to the per-table buffers."""
+    for table, rows in children.items():
+        if rows:
+            columns = _child_columns(table)
+            block = {'nctId': [nct_id] * len(rows)}
+            for i, column in enumerate(columns):
+                block[column] = [row[i] for row in rows]
+            buffers[table].extend_columns(block)
+
+
+def iter_clinical_trials_data(COND, **kwargs):
+    """Yield normalized study rows (dicts) page by page as they are fetched.
+
+    Keyword arguments are passed through to iter_clinical_trials_pages.
+    """
+    for studies in iter_clinical_trials_pages(COND, **kwargs):
+        yield from map(normalize_study, studies)
+
+
+class ColumnBuffer:
+    """Growing columnar buffer of normalized rows, one list per column."""
+
+    def __init__(self):
+        self.columns = {}
+        self.n_rows = 0
+
+    def append(self, row):
+        for key, value in row.items():
+            column = self.columns.get(key)
+            if column is None:
+                # Column first seen now: back-fill earlier rows with None
+                column = self.columns[key] = [None] * self.n_rows
+            column.append(value)
+        self.n_rows += 1
+        for column in self.columns.values():
+            if len(column) < self.n_rows:
+                column.append(None)
+
+    def extend(self, rows):
+        for row in rows:
+            self.append(row)
+
+    def extend_columns(self, columns):
+        """Append a block of rows given as equally long column lists, e.g. from normalize_page."""
+        n_new = len(next(iter(columns.values()), []))
+        for key, values in columns.items():
+            column = self.columns.get(key)
+            if column is None:
+                column = self.columns[key] = [None] * self.n_rows
+            column.extend(values)
+        self.n_rows += n_new
+        for column in self.columns.values():
+            if len(column) < self.n_rows:
+                column.extend([None] * (self.n_rows - len(column)))
+
+    def to_frame(self):
+        return pd.DataFrame(self.columns)
+
+
+_DEFAULT_DATE = parse('2000-01-01')
+
+# CT.gov date formats recognised in bulk; anything else falls back to parse_date
+_DATE_FORMATS = [
+    (r'\d{4}-\d{2}-\d{2}', '%Y-%m-%d'),
+    (r'\d{4}-\d{2}', '%Y-%m'),
+    (r'\d{4}', '%Y'),
+]
+
+
+def parse_date(date_str):
+    if pd.isna(date_str):
+        return pd.NaT
+    if isinstance(date_str, list):
+        date_str = date_str[0] if date_str else None
+    if not date_str:
+        return pd.NaT
+    try:
+        # Parse the date, set day to 1 if only year and month are provided
+        parsed_date = parse(date_str, default=_DEFAULT_DATE)
+        if len(date_str) <= 7:  # If only year or year-month is provided
+            return parsed_date.replace(day=1)
+        return parsed_date
+    except ParserError:
+        return pd.NaT
+
+
+def parse_dates(values):
+    """Vectorized parse_date for a whole column.
+
+    YYYY, YYYY-MM and YYYY-MM-DD strings are converted in bulk with
+    pd.to_datetime (partial dates land on day 1, as in parse_date). Only values
+    that match none of these formats, or fail to convert, go through the
+    per-cell dateutil fallback.
+    """
+    values = pd.Series(values)
+    parsed = pd.Series(pd.NaT, index=values.index, dtype='datetime64[ns]')
+    if values.dtype != object:
+        return pd.to_datetime(values.apply(parse_date))
+
+    remaining = values.notna()
+    for pattern, fmt in _DATE_FORMATS:
+        mask = remaining & values.str.fullmatch(pattern, na=False)
+        if mask.any():
+            converted = pd.to_datetime(values[mask], format=fmt, errors='coerce')
+            parsed[mask] = converted
+            # Values with the right shape but an impossible date are left for the fallback
+            remaining &= ~(mask & converted.reindex(values.index).notna())
+
+    if remaining.any():
+        parsed[remaining] = pd.to_datetime(values[remaining].apply(parse_date))
+    return parsed
+
+
+# Compact in-memory schema: low-cardinality enums become categoricals, counts and
+# flags nullable Int32/boolean, and the remaining free text Arrow-backed strings.
+# Comma-joined multi-value columns such as phases and whoMasked stay strings, so
+# .str methods and assignments work on them like on the other joined columns.
+CATEGORY_COLUMNS = [
+    'organizationType', 'overallStatus', 'completionDateType', 'lastUpdatePostDateType', 'leadSponsorType',
+    'studyType', 'allocation', 'interventionModel', 'primaryPurpose', 'masking',
+    'enrollmentType', 'eligibilityGender',
+]
+INTEGER_COLUMNS = ['enrollmentCount']
+BOOLEAN_COLUMNS = ['hasExpandedAccess', 'HasResults', 'healthyVolunteers']
+
+try:
+    import pyarrow  # noqa: F401
+    STRING_DTYPE = 'string[pyarrow]'
+except ImportError:
+    # Without pyarrow free text stays as Python objects
+    STRING_DTYPE = None
+
+
+def apply_compact_dtypes(df):
+    """Convert a normalized trials frame to the compact schema above."""
+    for col in df.columns:
+        if col in CATEGORY_COLUMNS:
+            df[col] = df[col].astype('category')
+        elif col in INTEGER_COLUMNS:
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype('Int32')
+        elif col in BOOLEAN_COLUMNS:
+            df[col] = df[col].astype('boolean')
+        elif STRING_DTYPE and df[col].dtype == object and pd.api.types.infer_dtype(df[col], skipna=True) in ('string', 'empty'):
+            # List-valued columns such as eligibilityStandardAges stay as objects
+            df[col] = df[col].astype(STRING_DTYPE)
+    return df
+
+
+def finalize_clinical_trials_frame(df, compact=True):
+    """Convert the raw string date columns of a normalized trials frame and, with
+    ``compact``, apply the compact dtype schema."""
+    for col in DATE_COLUMNS:
+        if col in df.columns:
+            df[col] = parse_dates(df[col])
+    if compact:
+        df = apply_compact_dtypes(df)
     return df
+
+
+def finalize_child_tables(buffers):
+    """Turn per-table ColumnBuffers into compact DataFrames (empty tables keep their columns)."""
+    tables = {}
+    for table, buffer in buffers.items():
+        df = buffer.to_frame() if buffer.n_rows else pd.DataFrame(columns=['nctId'] + _child_columns(table))
+        for col in df.columns:
+            if col in ('country', 'state', 'type', 'class'):
+                df[col] = df[col].astype('category')
+            elif STRING_DTYPE:
+                df[col] = df[col].astype(STRING_DTYPE)
+        tables[table] = df
+    return tables
+
+
+def build_lookups(tables):
+    """
+    Build value -> nctIds indexes over the child tables.
+
+    Keys are lower-cased and stripped, so ``lookups['country']['germany']``
+    returns the sorted nctIds of all trials with a site in Germany, as an exact
+    match (searching for 'niger' does not return trials in Nigeria).
+
+    Returns:
+        dict: lookup name (see LOOKUP_COLUMNS) -> {value: [nctId, ...]}.
+    """
+    lookups = {}
+    for name, (table, column) in LOOKUP_COLUMNS.items():
+        df = tables[table][['nctId', column]].dropna()
+        keys = df[column].astype(str).str.strip().str.lower()
+        lookups[name] = {key: sorted(set(ids)) for key, ids in df['nctId'].astype(str).groupby(keys.values)}
+    return lookups
+
+
+def copy_lookups(lookups):
+    """Copy build_lookups output down to the nctId lists, so changes to the copy leave the original intact."""
+    return {name: {key: list(ids) for key, ids in index.items()} for name, index in (lookups or {}).items()}
+
+
+def get_clinical_trials_tables(COND, client=None, base_url=BASE_URL):
+    """
+    Fetch trials like get_clinical_trials_data and also build the companion tables.
+
+    Returns:
+        tuple: (trials DataFrame, {table: DataFrame} for CHILD_TABLES, lookups from build_lookups)
+    """
+    buffer = ColumnBuffer()
+    child_buffers = {table: ColumnBuffer() for table in CHILD_TABLES}
+    for studies in iter_clinical_trials_pages(COND, client=client, base_url=base_url):
+        buffer.extend_columns(normalize_page(studies))
+        normalize_children(studies, child_buffers)
+        del studies
+
+    df = finalize_clinical_trials_frame(buffer.to_frame())
+    tables = finalize_child_tables(child_buffers)
+    return df, tables, build_lookups(tables)
+
+
+def get_clinical_trials_data(COND, client=None, base_url=BASE_URL, store=None):
+    # A study_store.StudyStore holding a full dump import answers locally after a delta sync
+    if store is not None and store.bulk_import_date():
+        return store.get_clinical_trials_data(COND, client=client)
+
+    # Normalize each page as it arrives so that raw JSON never piles up
+    buffer = ColumnBuffer()
+    for studies in iter_clinical_trials_pages(COND, client=client, base_url=base_url):
+        buffer.extend_columns(normalize_page(studies))
+        del studies
+
+    # Convert to DataFrame
+    df = buffer.to_frame()
+    del buffer
+
+    return finalize_clinical_trials_frame(df)
     
 
 # Example usage:
-# df = get_clinical_trials_data("Novartis")
\ No newline at end of file
+# df = get_clinical_trials_data("Novartis")
@@ -0,0 +1,217 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[.,'-][a-z0-9]+)*")
+# Words that do not change what a question asks for. Negations, comparisons and
+# question types such as 'many' or 'list' are deliberately not in here.
+STOPWORDS = {
+    'a', 'about', 'all', 'an', 'any', 'are', 'at', 'be', 'been', 'can', 'could', 'data', 'dataset', 'do', 'does',
+    'for', 'from', 'have', 'has', 'how', 'i', 'in', 'is', 'it', 'its', 'me', 'of', 'on', 'please', 'tell', 'that',
+    'the', 'their', 'there', 'these', 'they', 'this', 'those', 'to', 'us', 'was', 'we', 'were', 'what', 'which',
+    'with', 'you',
+}
+# Words that ask for the same thing, mapped to one spelling
+PARAPHRASES = {
+    'count': 'many', 'number': 'many',
+    'display': 'list', 'give': 'list', 'show': 'list',
+    'study': 'trial', 'medication': 'drug', 'medicine': 'drug',
+    'average': 'mean',
+}
+
+
+def normalize_question(question):
+    """Lower-case a question, collapse whitespace and drop trailing punctuation."""
+    return re.sub(r"[\s?.!]+$", "", " ".join(str(question).lower().split()))
+
+
+def content_tokens(question):
+    """
+    Return the words of a question that decide what its code does, case-insensitively.
+
+    Every word but the STOPWORDS counts, including numbers and entity names
+    such as 'germany' or 'pfizer'. Plurals and the PARAPHRASES are reduced to
+    one spelling, so 'How many studies?' and 'number of trials' agree.
+
+    Returns:
+        frozenset: The tokens.
+    """
+    tokens = set()
+    for token in TOKEN_RE.findall(str(question).lower()):
+        token = token.replace(",", "") if token[0].isdigit() else token
+        if token in STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith('ies'):
+            token = token[:-3] + 'y'
+        elif len(token) > 3 and token.endswith('s') and not token.endswith(('ss', 'is', 'us')):
+            token = token[:-1]
+        tokens.add(PARAPHRASES.get(token, token))
+    return frozenset(tokens)
+
+
+def schema_fingerprint(columns_by_df):
+    """
+    Hash the column names of the selected DataFrames.
+
+    Args:
+        columns_by_df (dict): DataFrame name -> iterable of column names.
+
+    Returns:
+        str: A hex digest independent of column order.
+    """
+    text = "|".join(f"{name}:{','.join(sorted(columns))}" for name, columns in sorted(columns_by_df.items()))
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+class CachedCode:
+    """Generated code that answered a question, with what it ran against and how often it worked."""
+
+    def __init__(self, question, dfs, fingerprint, code, embedding=None, tokens=frozenset()):
+        self.question = question
+        self.tokens = tokens
+        self.dfs = list(dfs)
+        self.fingerprint = fingerprint
+        self.code = code
+        self.embedding = embedding
+        self.successes = 1
+        # sha1 of (output, result frame) -> summary, for runs that reproduce an earlier result exactly
+        self.summaries = OrderedDict()
+
+    def summary_for(self, result_key):
+        return self.summaries.get(result_key)
+
+    def add_summary(self, result_key, summary, keep=8):
+        self.summaries[result_key] = summary
+        while len(self.summaries) > keep:
+            self.summaries.popitem(last=False)
+
+
+class CodeCache:
+    """A process-wide cache of generated analysis code keyed by question and schema.
+
+    A question is looked up by its normalized text first and, failing that,
+    by cosine similarity of its embedding to the cached questions. A similar
+    question also has to have the same content_tokens, since "trials in
+    germany" and "trials in france" embed almost identically but need
+    different code; only word order, stopwords and paraphrases may differ.
+    Either way an entry is only used if the selected
+    DataFrames still have the columns it was generated for
+    (schema_fingerprint). Entries are evicted least recently used first; an
+    entry whose code fails is dropped.
+    """
+
+    def __init__(self, embed=None, max_entries=256, similarity=0.92):
+        """
+        Args:
+            embed (callable, optional): text -> embedding vector. Without it only exact matches are used.
+            max_entries (int, optional): Entries kept. Defaults to 256.
+            similarity (float, optional): Minimum cosine similarity of a semantic match. Defaults to 0.92.
+        """
+        self.embed = embed
+        self.max_entries = max_entries
+        self.similarity = similarity
+        self._entries = OrderedDict()  # (normalized question, fingerprint) -> CachedCode, least recently used first
+        self._embeddings = OrderedDict()  # normalized question -> unit vector, for questions seen recently
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.failures = 0
+
+    def _embedding(self, question):
+        if self.embed is None:
+            return None
+        with self._lock:
+            vector = self._embeddings.get(question)
+        if vector is None:
+            try:
+                vector = np.asarray(self.embed(question), dtype=np.float32)
+            except Exception as e:
+                print("Question embedding failed:", e)
+                return None
+            vector /= np.linalg.norm(vector) or 1.0
+            with self._lock:
+                self._embeddings[question] = vector
+                while len(self._embeddings) > 2 * self.max_entries:
+                    self._embeddings.popitem(last=False)
+        return vector
+
+    def lookup(self, question, fingerprint_for):
+        """
+        Find cached code for a question.
+
+        Args:
+            question (str): The user's question.
+            fingerprint_for (callable): dfs list -> schema_fingerprint of those DataFrames in the asking session.
+
+        Returns:
+            CachedCode: The matching entry, or None.
+        """
+        tokens = content_tokens(question)
+        question = normalize_question(question)
+        with self._lock:
+            for key, entry in reversed(self._entries.items()):
+                if key[0] == question and entry.fingerprint == fingerprint_for(entry.dfs):
+                    self._entries.move_to_end(key)
+                    self.exact_hits += 1
+                    return entry
+            candidates = [(k, e) for k, e in self._entries.items()
+                          if e.embedding is not None and e.tokens == tokens]
+
+        vector = self._embedding(question) if candidates else None
+        if vector is not None:
+            keys, entries = zip(*candidates)
+            scores = np.stack([e.embedding for e in entries]) @ vector
+            for i in np.argsort(scores)[::-1]:
+                if scores[i] < self.similarity:
+                    break
+                if entries[i].fingerprint == fingerprint_for(entries[i].dfs):
+                    with self._lock:
+                        if keys[i] in self._entries:
+                            self._entries.move_to_end(keys[i])
+                        self.semantic_hits += 1
+                    return entries[i]
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def store(self, question, dfs, fingerprint, code):
+        """Cache code that ran successfully for a question and return its entry."""
+        tokens = content_tokens(question)
+        question = normalize_question(question)
+        entry = CachedCode(question, dfs, fingerprint, code, self._embedding(question), tokens)
+        key = (question, fingerprint)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def record_success(self, entry):
+        with self._lock:
+            entry.successes += 1
+
+    def invalidate(self, entry):
+        """Drop an entry whose code no longer runs."""
+        with self._lock:
+            key = (entry.question, entry.fingerprint)
+            if self._entries.get(key) is entry:
+                del self._entries[key]
+            self.failures += 1
+
+    def stats(self):
+        """Return hit/miss counters and the most reused entries."""
+        with self._lock:
+            top = sorted(self._entries.values(), key=lambda e: e.successes, reverse=True)[:5]
+            return {
+                'entries': len(self._entries),
+                'exact_hits': self.exact_hits,
+                'semantic_hits': self.semantic_hits,
+                'misses': self.misses,
+                'failures': self.failures,
+                'top_questions': {e.question: e.successes for e in top},
+            }
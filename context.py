@@ -51,6 +51,15 @@ The column headings and its description are given
 -state:  The state where the clinical trial locations are situated.
 -country:  The country where the clinical trial locations are situated.
 -interventionBiological:  Biological interventions (e.g., vaccines, blood products) used in the clinical trial.
+
+Companion tables keyed by nctId (one row per value, join to clinical_trials_df on nctId):
+-ct_sites_df: nctId, facility, city, state, country (one row per trial site)
+-ct_interventions_df: nctId, type, name (one row per intervention; type like 'DRUG', 'BIOLOGICAL', 'DEVICE')
+-ct_conditions_df: nctId, condition
+-ct_collaborators_df: nctId, name, class
+-ct_lookup: dict of exact-match indexes {lookup: {lower-cased value: [nctId, ...]}} for lookups 'facility', 'city', 'state', 'country', 'intervention', 'condition', 'collaborator'.
+ Prefer these over str.contains on the comma-joined columns, e.g. trials in Germany:
+ clinical_trials_df[clinical_trials_df['nctId'].isin(ct_lookup['country'].get('germany', []))]
 """
 
 fda_context = """Pandas DataFrame name is 'FDA_drugs_df' :
@@ -84,3 +93,17 @@ Some column details are:
 -upc: Universal Product Code for the drug.
 -pharm_class_cs: Chemical structure-based pharmacological class of the drug.
 """
+
+text_search_context = """A full-text search helper is available: search(df_name, column, query) returns the rows of the
+dataframe named df_name ('clinical_trials_df' or 'FDA_drugs_df') whose text column matches query, using a prebuilt index.
+Prefer it over str.contains on the long text columns: briefSummary, detailedDescription, eligibilityCriteria and
+interventionDescription of clinical_trials_df, and indications_and_usage, adverse_reactions and warnings of FDA_drugs_df.
+Query syntax: words match whole words ignoring case, "quoted phrases", AND (default between words), OR, NOT,
+parentheses and a trailing * for prefixes, e.g. search('FDA_drugs_df', 'adverse_reactions', '(nausea OR vomiting) AND NOT "renal impairment"')
+"""
+
+drug_lookup_context = """A drug name helper is available: drug_lookup(name) resolves a brand, generic or substance name
+(any case) and returns {'ingredients': [...], 'brand_names': [...], 'generic_names': [...]}, where the names are all
+products sharing those ingredients. Use it to match a drug by any of its names, e.g.
+names = drug_lookup('lipitor'); FDA_drugs_df[FDA_drugs_df['generic_name'].str.upper().isin([n.upper() for n in names['generic_names']])]
+"""
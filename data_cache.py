@@ -0,0 +1,153 @@
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import pandas as pd
+
+
+def estimate_size(value):
+    """Approximate memory footprint in bytes of a cached value: DataFrames (deep) inside tuples, lists and dicts."""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value.values())
+    return sys.getsizeof(value)
+
+
+class DataCache:
+    """A thread-safe, process-wide cache of loaded search results shared by all sessions.
+
+    Entries expire ``ttl`` seconds after they were loaded and the least
+    recently used ones are evicted once the estimated size of all entries
+    exceeds ``max_bytes``. Concurrent requests for a key that is being loaded
+    wait for that single load instead of starting their own.
+
+    Cached values are shared: callers must treat them as read-only and hand
+    out copies to code that may modify them. With pandas Copy-on-Write
+    enabled, as the app does at startup, ``df.copy(deep=False)`` copies are
+    enough; without it they share their columns with the cached frame.
+    """
+
+    def __init__(self, ttl=3600, max_bytes=1 << 30):
+        """
+        Args:
+            ttl (int, optional): Seconds an entry stays valid. Defaults to 3600.
+            max_bytes (int, optional): Memory budget for all entries. Defaults to 1 GiB.
+        """
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (value, size, loaded_at), least recently used first
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.evictions = 0
+
+    def get_or_load(self, key, loader, cacheable=None):
+        """
+        Return the cached value for ``key``, calling ``loader()`` to produce it if needed.
+
+        Args:
+            key (tuple): The cache key, e.g. ('fda', keyword, domain).
+            loader (callable): Produces the value; runs at most once at a time per key.
+            cacheable (callable, optional): Called with the loaded value; a false result returns the
+                value without caching it (e.g. failed fetches). Defaults to caching anything but None.
+
+        Returns:
+            The cached or freshly loaded value. Exceptions from ``loader`` propagate to every waiter.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[2] <= self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                self._remove(key)
+            flight = self._in_flight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._in_flight[key] = Future()
+                self.misses += 1
+            else:
+                self.waits += 1
+        if not leader:
+            return flight.result()
+
+        try:
+            value = loader()
+        except BaseException as e:
+            with self._lock:
+                del self._in_flight[key]
+            flight.set_exception(e)
+            raise
+
+        keep = cacheable(value) if cacheable is not None else value is not None
+        size = estimate_size(value) if keep else 0
+        with self._lock:
+            del self._in_flight[key]
+            if keep and size <= self.max_bytes:
+                self._entries[key] = (value, size, time.monotonic())
+                self.bytes += size
+                while self.bytes > self.max_bytes:
+                    self._remove(next(iter(self._entries)))
+                    self.evictions += 1
+        flight.set_result(value)
+        return value
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self.bytes -= size
+
+    def invalidate(self, key=None):
+        """Drop one entry, or every entry if ``key`` is None."""
+        with self._lock:
+            for k in [key] if key is not None else list(self._entries):
+                if k in self._entries:
+                    self._remove(k)
+
+    def stats(self):
+        """Return hit/miss counters and memory use as a dict."""
+        with self._lock:
+            lookups = self.hits + self.misses + self.waits
+            return {
+                'entries': len(self._entries),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'waits': self.waits,
+                'evictions': self.evictions,
+                'in_flight': len(self._in_flight),
+                'hit_rate': (self.hits + self.waits) / lookups if lookups else 0.0,
+            }
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_data_cache():
+    """
+    Return the process-wide DataCache, creating it on first use.
+
+    The TTL and memory budget come from the DATA_CACHE_TTL (seconds, default
+    3600) and DATA_CACHE_MAX_MB (default 1024) environment variables.
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = DataCache(
+                ttl=int(os.environ.get("DATA_CACHE_TTL", 3600)),
+                max_bytes=int(os.environ.get("DATA_CACHE_MAX_MB", 1024)) << 20,
+            )
+        return _default_cache
@@ -0,0 +1,196 @@
+import argparse
+import json
+import os
+import sqlite3
+import threading
+
+from label_loader import download_bulk_files, iter_bulk_batches
+from label_store import DEFAULT_LABEL_STORE_PATH, LabelStore, get_label_store
+
+DEFAULT_SYNONYMS_PATH = os.environ.get(
+    "DRUG_SYNONYMS_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "drug_synonyms.json")
+)
+
+NAME_FIELDS = ['brand_name', 'generic_name', 'substance_name']
+
+
+class DrugSynonyms:
+    """Brand, generic and substance names mapped to canonical ingredients.
+
+    Names are kept exactly as openFDA spells them in the 'openfda' section of
+    a label, so they can be sent back as ``openfda.<field>.exact`` searches.
+    The canonical ingredients of a product are its substance names (or its
+    generic names when it has none), upper-cased.
+    """
+
+    def __init__(self, fields=None):
+        """
+        Args:
+            fields (dict, optional): field -> {exact name -> iterable of canonical ingredients},
+                as written by save().
+        """
+        self.fields = {field: {} for field in NAME_FIELDS}
+        for field, names in (fields or {}).items():
+            for name, ingredients in names.items():
+                self.fields[field][name] = set(ingredients)
+        self._index()
+
+    def add(self, names):
+        """
+        Add one product.
+
+        Args:
+            names (dict): field -> list of names, e.g. the 'openfda' section of a label.
+        """
+        ingredients = names.get('substance_name') or names.get('generic_name') or []
+        ingredients = {str(ingredient).upper() for ingredient in ingredients}
+        for field in NAME_FIELDS:
+            for name in names.get(field) or []:
+                self.fields[field].setdefault(str(name), set()).update(ingredients)
+
+    def _index(self):
+        # lower-cased name -> [(field, exact name)], and ingredient -> field -> exact names
+        self._by_lower = {}
+        self._by_ingredient = {}
+        for field, names in self.fields.items():
+            for name, ingredients in names.items():
+                self._by_lower.setdefault(name.lower(), []).append((field, name))
+                for ingredient in ingredients:
+                    self._by_ingredient.setdefault(ingredient, {}).setdefault(field, set()).add(name)
+        self._lowered = {field: [(name.lower(), name) for name in sorted(names)] for field, names in self.fields.items()}
+
+    @classmethod
+    def from_ndc_records(cls, batches):
+        """Build the index from batches of openFDA drug/ndc records."""
+        synonyms = cls()
+        for records in batches:
+            for record in records:
+                names = dict(record.get('openfda') or {})
+                for field in ('brand_name', 'generic_name'):
+                    if record.get(field):
+                        names[field] = list(names.get(field, [])) + [record[field]]
+                if not names.get('substance_name'):
+                    names['substance_name'] = [item['name'] for item in record.get('active_ingredients', []) if item.get('name')]
+                synonyms.add(names)
+        synonyms._index()
+        return synonyms
+
+    @classmethod
+    def from_label_store(cls, store):
+        """Build the index from the label_names table of an imported label_store.LabelStore."""
+        synonyms = cls()
+        conn = sqlite3.connect(store.path)
+        try:
+            names, current = {}, None
+            for label_id, field, name in conn.execute("SELECT label_id, field, name FROM label_names ORDER BY label_id"):
+                if label_id != current:
+                    synonyms.add(names)
+                    names, current = {}, label_id
+                names.setdefault(field, []).append(name)
+            synonyms.add(names)
+        finally:
+            conn.close()
+        synonyms._index()
+        return synonyms
+
+    @classmethod
+    def load(cls, path=DEFAULT_SYNONYMS_PATH):
+        """Load an index written by save()."""
+        with open(path) as f:
+            return cls(json.load(f))
+
+    @classmethod
+    def default(cls, label_store=None, path=DEFAULT_SYNONYMS_PATH):
+        """Return the saved index, one built from an imported label store, or None if neither exists."""
+        if os.path.exists(path):
+            return cls.load(path)
+        if label_store is not None and label_store.import_date():
+            return cls.from_label_store(label_store)
+        return None
+
+    def save(self, path=DEFAULT_SYNONYMS_PATH):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump({field: {name: sorted(ingredients) for name, ingredients in names.items()}
+                       for field, names in self.fields.items()}, f)
+
+    def matching_names(self, keyword, fields=('brand_name', 'generic_name')):
+        """
+        Return the exact names containing ``keyword`` (case-insensitively), per field.
+
+        This is the set of names a label must carry to pass the brand/generic
+        str.contains filter of Open_FDA.open_fda_main.
+
+        Returns:
+            dict: field -> list of exact names; fields without a match are omitted.
+        """
+        keyword = str(keyword).lower().strip()
+        matches = {}
+        for field in fields:
+            names = [name for lowered, name in self._lowered[field] if keyword in lowered]
+            if names:
+                matches[field] = names
+        return matches
+
+    def lookup(self, name):
+        """
+        Resolve a brand, generic or substance name (any case) to its ingredients and their other names.
+
+        Returns:
+            dict: {'ingredients': [...], 'brand_names': [...], 'generic_names': [...]}, empty lists if unknown.
+        """
+        ingredients = set()
+        for field, exact in self._by_lower.get(str(name).lower().strip(), []):
+            ingredients.update(self.fields[field][exact])
+        brand_names, generic_names = set(), set()
+        for ingredient in ingredients:
+            brand_names.update(self._by_ingredient[ingredient].get('brand_name', ()))
+            generic_names.update(self._by_ingredient[ingredient].get('generic_name', ()))
+        return {
+            'ingredients': sorted(ingredients),
+            'brand_names': sorted(brand_names),
+            'generic_names': sorted(generic_names),
+        }
+
+
+_default_synonyms = None
+_default_synonyms_loaded = False
+_default_synonyms_lock = threading.Lock()
+
+
+def get_drug_synonyms():
+    """
+    Return the process-wide DrugSynonyms.default index of the shared label store, loading it on first use.
+
+    None is remembered too, so an index saved or imported later is only picked
+    up after a restart.
+    """
+    global _default_synonyms, _default_synonyms_loaded
+    with _default_synonyms_lock:
+        if not _default_synonyms_loaded:
+            _default_synonyms = DrugSynonyms.default(get_label_store())
+            _default_synonyms_loaded = True
+        return _default_synonyms
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the brand/generic/substance synonym index.")
+    parser.add_argument("zip_paths", nargs="*", help="openFDA drug-ndc-*.json.zip files")
+    parser.add_argument("--download", metavar="DIRECTORY", help="Download the current drug/ndc bulk files into DIRECTORY first")
+    parser.add_argument("--from-labels", action="store_true", help="Build from the imported local label store instead")
+    parser.add_argument("--store", default=DEFAULT_LABEL_STORE_PATH, help="Label store path for --from-labels")
+    parser.add_argument("--output", default=DEFAULT_SYNONYMS_PATH, help="Where to write the index")
+    args = parser.parse_args()
+
+    if args.from_labels:
+        synonyms = DrugSynonyms.from_label_store(LabelStore(args.store))
+    else:
+        zip_paths = list(args.zip_paths)
+        if args.download:
+            zip_paths += download_bulk_files(args.download, endpoint="ndc")
+        if not zip_paths:
+            parser.error("no bulk files given; pass zip paths, --download DIRECTORY or --from-labels")
+        synonyms = DrugSynonyms.from_ndc_records(iter_bulk_batches(zip_paths))
+    synonyms.save(args.output)
+    print(f"Wrote {sum(len(names) for names in synonyms.fields.values())} names to {args.output}")
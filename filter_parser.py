@@ -32,13 +32,63 @@ class Filter_Parser_Data:
         """
         Clean and format the given Open FDA value by removing duplicates and joining the values into a single string.
 
+        Duplicates are removed keeping the first occurrence, so the output is
+        stable between runs.
+
         Args:
             openfda_value (list): A list of values to clean and format.
 
         Returns:
             str: A cleaned and formatted string of values.
         """
-        clean_list = list(set(openfda_value))
-        clean_list = [str(item) for item in clean_list]
-        temp_values = "/".join(clean_list)
-        return temp_values
+        if len(openfda_value) == 1:
+            return str(openfda_value[0])
+        return "/".join([str(item) for item in dict.fromkeys(openfda_value)])
+
+    @staticmethod
+    def compile_openfda_projector(needed_column_names):
+        """
+        Build a function that projects raw Open FDA label records onto the needed columns.
+
+        The column list and lookup set are prepared once. Each record is then
+        handled in one pass: only the needed keys present at the top level and
+        in its 'openfda' section are visited and cleaned, and the values are
+        written straight into per-column lists.
+
+        Args:
+            needed_column_names (iterable): The field names to keep.
+
+        Returns:
+            callable: A function taking the 'results' list of a response and returning
+                a dict of column name -> list of cleaned values (None where absent). The
+                columns are in the order they first appear in the records, as the
+                row-by-row DataFrame used to have them, followed by any never seen.
+        """
+        columns = list(dict.fromkeys(needed_column_names))
+        needed = frozenset(columns)
+        clean = Filter_Parser_Data.clean_openfda_value
+
+        def project(records):
+            n_records = len(records)
+            data = {column: [None] * n_records for column in columns}
+            order = {}  # columns in order of first appearance
+            for i, record in enumerate(records):
+                present = needed.intersection(record)
+                for key in present:
+                    data[key][i] = clean(record[key])
+                openfda = record.get("openfda")
+                if openfda:
+                    present_openfda = needed.intersection(openfda)
+                    for key in present_openfda:
+                        data[key][i] = clean(openfda[key])
+                    present = present | present_openfda
+                if not present.issubset(order):
+                    # Only records that bring a new column are walked in key order
+                    for key in record:
+                        if key == "openfda":
+                            order.update((name, None) for name in openfda if name in needed)
+                        elif key in needed:
+                            order[key] = None
+            return {column: data[column] for column in [*order, *(c for c in columns if c not in order)]}
+
+        return project
@@ -0,0 +1,78 @@
+import argparse
+import os
+import zipfile
+
+from http_client import get_http_client, json_loads
+from label_store import DEFAULT_LABEL_STORE_PATH, LabelStore
+
+DOWNLOAD_INDEX_URL = "https://api.fda.gov/download.json"
+
+
+def bulk_file_urls(endpoint="label", client=None):
+    """Return the URLs of the current bulk files of a drug endpoint ("label", "ndc", ...) listed by the openFDA download index."""
+    client = client or get_http_client()
+    index = client.get_json(DOWNLOAD_INDEX_URL)
+    return [partition["file"] for partition in index["results"]["drug"][endpoint]["partitions"]]
+
+
+def download_bulk_files(directory, endpoint="label", client=None, chunk_size=1 << 20):
+    """
+    Stream every bulk file of a drug endpoint (e.g. drug-label-NNNN-of-NNNN.json.zip) into ``directory``.
+
+    Returns:
+        list: The paths of the downloaded zip files.
+    """
+    client = client or get_http_client()
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for url in bulk_file_urls(endpoint, client):
+        path = os.path.join(directory, url.rsplit("/", 1)[-1])
+        with client.session.get(url, stream=True, timeout=client.timeout) as response:
+            response.raise_for_status()
+            with open(path, "wb") as f:
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    f.write(chunk)
+        paths.append(path)
+    return paths
+
+
+def iter_bulk_batches(zip_paths):
+    """Yield the 'results' list of every JSON file inside the given bulk zips, one file at a time."""
+    for zip_path in zip_paths:
+        with zipfile.ZipFile(zip_path) as archive:
+            for info in archive.infolist():
+                if info.filename.endswith(".json"):
+                    with archive.open(info) as member:
+                        yield json_loads(member.read())["results"]
+
+
+def bulk_import(zip_paths, store=None):
+    """
+    Import the openFDA drug-label bulk files into a LabelStore, replacing its contents.
+
+    Args:
+        zip_paths (list): Paths of the drug-label-*.json.zip files.
+        store (LabelStore, optional): Target store. Defaults to LabelStore() at the default path.
+
+    Returns:
+        int: The number of labels imported.
+    """
+    store = store or LabelStore()
+    imported = store.import_labels(iter_bulk_batches(zip_paths))
+    print(f"Imported {imported} drug labels into {store.path}")
+    return imported
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import the openFDA drug-label bulk download into the local label store.")
+    parser.add_argument("zip_paths", nargs="*", help="drug-label-*.json.zip files (or use --download)")
+    parser.add_argument("--download", metavar="DIRECTORY", help="Download the current bulk files into DIRECTORY first")
+    parser.add_argument("--store", default=DEFAULT_LABEL_STORE_PATH, help="SQLite store path")
+    args = parser.parse_args()
+
+    zip_paths = list(args.zip_paths)
+    if args.download:
+        zip_paths += download_bulk_files(args.download)
+    if not zip_paths:
+        parser.error("no bulk files given; pass zip paths or --download DIRECTORY")
+    bulk_import(zip_paths, LabelStore(args.store))
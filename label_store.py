@@ -0,0 +1,192 @@
+import os
+import sqlite3
+import threading
+from datetime import date
+
+from openfda import Open_FDA
+
+DEFAULT_LABEL_STORE_PATH = os.environ.get(
+    "FDA_LABEL_STORE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "fda_labels.sqlite")
+)
+
+LABEL_COLUMNS = sorted(Open_FDA.needed_column_names)
+
+# Narrative sections covered by the full-text index
+FTS_COLUMNS = [
+    'indications_and_usage',
+    'contraindications',
+    'warnings',
+    'warnings_and_cautions',
+    'precautions',
+    'adverse_reactions',
+    'drug_interactions',
+    'dosage_and_administration',
+    'mechanism_of_action',
+    'clinical_studies',
+    'description',
+]
+
+# Name fields answered through the label_names B-tree index, one row per distinct name
+NAME_FIELDS = ['brand_name', 'generic_name', 'substance_name']
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS labels (
+    label_id INTEGER PRIMARY KEY,
+    {', '.join(f'{column} TEXT' for column in LABEL_COLUMNS)}
+);
+CREATE TABLE IF NOT EXISTS label_names (
+    field TEXT NOT NULL,
+    name TEXT NOT NULL COLLATE NOCASE,
+    label_id INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS label_names_lookup ON label_names (field, name);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS labels_fts USING fts5 (
+    {', '.join(FTS_COLUMNS)}, content='labels', content_rowid='label_id'
+);
+"""
+
+
+class LabelStore:
+    """A local mirror of the openFDA drug-label endpoint, built from its bulk download files.
+
+    Every label is stored with the same cleaned Open_FDA.needed_column_names
+    fields open_fda_data returns. Disease searches run as FTS5 phrase queries
+    on indications_and_usage, drug searches as exact (case-insensitive) name
+    lookups, so Open_FDA.open_fda_main can answer without api.fda.gov.
+    """
+
+    def __init__(self, path=DEFAULT_LABEL_STORE_PATH):
+        """
+        Args:
+            path (str, optional): Location of the SQLite file. Defaults to data/fda_labels.sqlite
+                next to this module, or the FDA_LABEL_STORE_PATH environment variable.
+        """
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def import_date(self):
+        """Return the date of the last bulk import, or None if the store is empty."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'import_date'").fetchone()
+        return row[0] if row else None
+
+    def import_labels(self, batches):
+        """
+        Replace the store's contents with the given labels.
+
+        The bulk download is a full snapshot, so existing labels are dropped,
+        the new ones written in one transaction and the full-text index rebuilt
+        once at the end.
+
+        Args:
+            batches (iterable): Lists of raw label records, e.g. the 'results' of each bulk file.
+
+        Returns:
+            int: The number of labels imported.
+        """
+        placeholders = ", ".join("?" * (len(LABEL_COLUMNS) + 1))
+        imported = 0
+        with self._connect() as conn:
+            conn.execute("DELETE FROM labels")
+            conn.execute("DELETE FROM label_names")
+            for records in batches:
+                data = Open_FDA.project_records(records)
+                label_ids = range(imported + 1, imported + len(records) + 1)
+                conn.executemany(
+                    f"INSERT INTO labels (label_id, {', '.join(LABEL_COLUMNS)}) VALUES ({placeholders})",
+                    zip(label_ids, *(data[column] for column in LABEL_COLUMNS)),
+                )
+                conn.executemany(
+                    "INSERT INTO label_names (field, name, label_id) VALUES (?, ?, ?)",
+                    [
+                        (field, name, label_id)
+                        for label_id, record in zip(label_ids, records)
+                        for field in NAME_FIELDS
+                        for name in dict.fromkeys(record.get("openfda", {}).get(field, []))
+                    ],
+                )
+                imported += len(records)
+            conn.execute("INSERT INTO labels_fts (labels_fts) VALUES ('rebuild')")
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('import_date', ?)", (date.today().isoformat(),)
+            )
+        return imported
+
+    def search(self, user_keyword, keyword_domain, limit=None, names=None):
+        """
+        Run the Open_FDA.open_fda_url_selection search against the local mirror.
+
+        Args:
+            user_keyword (str): The keyword to search for.
+            keyword_domain (str): "disease" for an indications_and_usage phrase match,
+                "drug" for an exact brand or generic name match.
+            limit (int, optional): The maximum number of labels to return. Defaults to all.
+            names (dict, optional): For drug searches, field -> exact names to match instead of the
+                keyword, as returned by DrugSynonyms.matching_names.
+
+        Returns:
+            dict: Column name -> list of values, in the shape Open_FDA.open_fda_data returns.
+        """
+        columns = ", ".join(f"l.{column}" for column in LABEL_COLUMNS)
+        if keyword_domain == "disease":
+            phrase = '"' + " ".join(str(user_keyword).split()).replace('"', '""') + '"'
+            sql = (
+                f"SELECT {columns} FROM labels_fts f JOIN labels l ON l.label_id = f.rowid "
+                "WHERE labels_fts MATCH ? ORDER BY l.label_id"
+            )
+            params = [f"indications_and_usage : {phrase}"]
+        elif keyword_domain == "drug" and names:
+            clauses, params = [], []
+            for field, field_names in names.items():
+                clauses.append(f"(field = ? AND name IN ({', '.join('?' * len(field_names))}))")
+                params += [field, *field_names]
+            sql = (
+                f"SELECT {columns} FROM labels l WHERE l.label_id IN ("
+                f"SELECT label_id FROM label_names WHERE {' OR '.join(clauses)}"
+                ") ORDER BY l.label_id"
+            )
+        elif keyword_domain == "drug":
+            sql = (
+                f"SELECT {columns} FROM labels l WHERE l.label_id IN ("
+                "SELECT label_id FROM label_names WHERE field IN ('brand_name', 'generic_name') AND name = ?"
+                ") ORDER BY l.label_id"
+            )
+            params = [str(user_keyword).strip()]
+        else:
+            raise ValueError(f"Unknown keyword domain {keyword_domain!r}")
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        data = {column: [] for column in LABEL_COLUMNS}
+        appenders = [data[column].append for column in LABEL_COLUMNS]
+        with self._connect() as conn:
+            for row in conn.execute(sql, params):
+                for append, value in zip(appenders, row):
+                    append(value)
+        return data
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_label_store():
+    """Return the process-wide LabelStore at the default path, creating it on first use."""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = LabelStore()
+        return _default_store
@@ -0,0 +1,108 @@
+import os
+import re
+import tempfile
+import weakref
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class LazyColumns:
+    """Heavy columns of a DataFrame parked in a memory-mapped Arrow file until code asks for them.
+
+    The columns are written once to an uncompressed Arrow IPC file and dropped
+    from the DataFrame. materialize() maps the file, converts only the
+    requested columns back to pandas and adds them to the DataFrame in place,
+    aligned on its index, so rows filtered out in the meantime are ignored.
+    Which columns are still pending is read from the DataFrame passed in, so
+    one store can back several (shallow) copies of the same frame. The file
+    is deleted when the original LazyColumns object is garbage collected.
+    """
+
+    def __init__(self, df, columns, transform=None, directory=None):
+        """
+        Args:
+            df (pd.DataFrame): The DataFrame holding the columns.
+            columns (list): The columns to park; those missing from ``df`` are ignored.
+            transform (callable, optional): Applied to the frame of loaded columns before they are
+                added back, e.g. Open_FDA.remove_column_headers_from_text.
+            directory (str, optional): Where to create the Arrow file. Defaults to the system temp dir.
+        """
+        self.columns = [column for column in columns if column in df.columns]
+        self.transform = transform
+        self.index = df.index
+
+        fd, self.path = tempfile.mkstemp(prefix="lazy_columns_", suffix=".arrow", dir=directory)
+        os.close(fd)
+        self._finalizer = weakref.finalize(self, _remove, self.path)
+        table = pa.Table.from_pandas(df[self.columns], preserve_index=False)
+        with pa.OSFile(self.path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+    def __getstate__(self):
+        # A pickled copy (e.g. sent to a sandbox worker) reads the same file but never deletes it
+        state = self.__dict__.copy()
+        state["_finalizer"] = None
+        return state
+
+    def pending(self, df):
+        """Return the parked columns that ``df`` does not hold yet."""
+        return [column for column in self.columns if column not in df.columns]
+
+    def referenced(self, df, code):
+        """Return the columns pending in ``df`` whose name appears as a whole word in ``code``."""
+        return [column for column in self.pending(df) if re.search(r"\b" + re.escape(column) + r"\b", code)]
+
+    def load(self, columns):
+        """Read ``columns`` from the Arrow file into a new DataFrame with the original index."""
+        with pa.memory_map(self.path) as source:
+            frame = pa.ipc.open_file(source).read_all().select(columns).to_pandas()
+        frame.index = self.index
+        return self.transform(frame) if self.transform is not None else frame
+
+    def materialize(self, df, columns=None):
+        """
+        Add parked columns back to ``df`` in place.
+
+        Args:
+            df (pd.DataFrame): The DataFrame the columns were split from (or a row subset of it).
+            columns (list, optional): The columns to load. Defaults to every pending column.
+
+        Returns:
+            list: The columns that were added.
+        """
+        columns = [column for column in (self.columns if columns is None else columns) if column not in df.columns]
+        if not columns:
+            return []
+        frame = self.load(columns)
+        for column in columns:
+            df[column] = frame[column]
+        return columns
+
+
+def split_lazy_columns(df, columns, transform=None, directory=None):
+    """
+    Split ``columns`` off a DataFrame into a LazyColumns store.
+
+    Returns:
+        tuple: (core DataFrame, LazyColumns), or (df, None) when pyarrow is not
+            installed or none of the columns are present, in which case nothing is split.
+    """
+    if pa is None or df is None or not any(column in df.columns for column in columns):
+        return df, None
+    lazy = LazyColumns(df, columns, transform=transform, directory=directory)
+    return df.drop(columns=lazy.columns), lazy
+
+
+def column_names(df, lazy=None):
+    """Return the columns of ``df`` followed by those still parked in ``lazy``."""
+    return list(df.columns) + (lazy.pending(df) if lazy is not None else [])
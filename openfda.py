@@ -1,51 +1,85 @@
 import requests
 import re
 import pandas as pd
+from urllib.parse import quote
+from concurrent.futures import ThreadPoolExecutor
 from filter_parser import Filter_Parser_Data
+from http_client import RateLimiter, get_http_client, json_loads
+from lazy_columns import split_lazy_columns
 
 
 class Open_FDA:
     """A class for fetching and processing data from the Open FDA API."""
 
-    @staticmethod
-    def total_rows_in_openfda(user_keyword, keyword_domain, timeout=5, max_retries=3):
-        """
-        Fetch the total number of results matching the given keyword and domain from the Open FDA API.
+    base_url = "https://api.fda.gov/drug/label.json"
+    page_size = 1000  # Largest limit the API accepts
+    max_skip = 25000  # Largest skip the API accepts; deeper pages need search_after
+    concurrency = 4
+    # Open FDA allows 240 requests per minute per IP (or key)
+    rate_limiter = RateLimiter(rate=4, burst=4)
 
-        Args:
-            user_keyword (str): The keyword to search for in the Open FDA API.
-            keyword_domain (str): The domain to search within (e.g., "disease" or "drug").
-            timeout (int, optional): The maximum number of seconds to wait for the request to complete. Defaults to 5.
-            max_retries (int, optional): The maximum number of times to retry the request if it fails. Defaults to 3.
-
-        Returns:
-            int: The total number of results found, or None if the request fails.
-        """
-        api_url = Open_FDA.open_fda_url_selection(user_keyword, keyword_domain)
-        for retry in range(max_retries):
-            try:
-                timeout_occurred = False
-                response = requests.get(api_url, timeout=timeout)
-                response.raise_for_status()
-                if response.status_code == 200:
-                    data = response.json()
-                    return data["meta"]["results"]["total"]
-            except requests.exceptions.Timeout:
-                timeout_occurred = True
-                print(
-                    f"Request timed out (attempt {retry+1}/{max_retries}). Retrying..."
-                )
-            except requests.exceptions.RequestException as e:
-                print("Error:", e)
-                break
-
-            if not timeout_occurred:
-                break
-
-        return None
+    needed_column_names = {
+        'adverse_reactions',
+        'application_number',
+        'brand_name',
+        'clinical_pharmacology',
+        'clinical_studies',
+        'contraindications',
+        'description',
+        'dosage_and_administration',
+        'drug_interactions',
+        'generic_name',
+        'how_supplied',
+        'indications_and_usage',
+        'information_for_patients',
+        'is_original_packager',
+        'manufacturer_name',
+        'mechanism_of_action',
+        'pharm_class_cs',
+        'pharm_class_epc',
+        'pharm_class_moa',
+        'pharmacodynamics',
+        'pharmacokinetics',
+        'product_type',
+        'route',
+        'substance_name',
+        'upc',
+        'warnings',
+        'warnings_and_cautions',
+        'laboratory_tests',
+        'drug_interactions',
+        'precautions',
+        'adverse_reactions'
+    }
+    # Long label sections most questions never touch; kept out of memory with open_fda_main(lazy=True)
+    heavy_columns = [
+        'adverse_reactions',
+        'clinical_pharmacology',
+        'clinical_studies',
+        'contraindications',
+        'description',
+        'dosage_and_administration',
+        'drug_interactions',
+        'how_supplied',
+        'information_for_patients',
+        'laboratory_tests',
+        'mechanism_of_action',
+        'pharmacodynamics',
+        'pharmacokinetics',
+        'precautions',
+        'warnings',
+        'warnings_and_cautions',
+    ]
+    # Compiled once: raw 'results' list -> dict of cleaned column lists
+    project_records = staticmethod(Filter_Parser_Data.compile_openfda_projector(needed_column_names))
+    # Longest search expression sent in one request; longer name lists are split across requests
+    max_search_length = 4000
+    # Most exact names a drug keyword is expanded to, for the API and the local label store;
+    # short keywords matching more names (e.g. "in") fall back to the plain keyword search
+    max_expanded_names = 200
 
     @staticmethod
-    def open_fda_url_selection(user_keyword, keyword_domain, limit=1):
+    def open_fda_url_selection(user_keyword, keyword_domain, limit=1, skip=0, search=None):
         """
         Generate the API URL for fetching data from the Open FDA API based on the given keyword and domain.
 
@@ -53,174 +87,257 @@ class Open_FDA:
             user_keyword (str): The keyword to search for in the Open FDA API.
             keyword_domain (str): The domain to search within (e.g., "disease" or "drug").
             limit (int, optional): The maximum number of results to return. Defaults to 1.
+            skip (int, optional): The number of results to skip. Defaults to 0.
+            search (str, optional): A prebuilt search expression (see drug_name_searches) used instead of the keyword.
 
         Returns:
             str: The generated API URL.
         """
-        if keyword_domain == "disease":
-            open_fda_api_url = f'https://api.fda.gov/drug/label.json?search=indications_and_usage:"{user_keyword}"&limit={limit}'
+        if search is not None:
+            open_fda_api_url = f'{Open_FDA.base_url}?search={search}&limit={limit}'
+        elif keyword_domain == "disease":
+            open_fda_api_url = f'{Open_FDA.base_url}?search=indications_and_usage:"{user_keyword}"&limit={limit}'
         elif keyword_domain == "drug":
-            open_fda_api_url = f'https://api.fda.gov/drug/label.json?search=brand_name.exact"{user_keyword}"+generic_name.exact"{user_keyword}"&limit={limit}'
+            open_fda_api_url = f'{Open_FDA.base_url}?search=brand_name.exact"{user_keyword}"+generic_name.exact"{user_keyword}"&limit={limit}'
+        if skip:
+            open_fda_api_url += f'&skip={skip}'
         return open_fda_api_url
 
     @staticmethod
-    def open_fda_data(user_keyword, keyword_domain, limit, timeout=5, max_retries=3):
+    def open_fda_data(user_keyword, keyword_domain, limit=None, timeout=5, max_retries=3, search=None):
         """
-        Fetch data from the Open FDA API for the given keyword, domain, and limit, and return a list of dictionaries containing the extracted data.
+        Fetch data from the Open FDA API for the given keyword, domain, and limit, and return the extracted data as columns.
+
+        The first page is requested with the largest page size and its 'meta'
+        section gives the total, so no separate count request is needed. The
+        remaining results are then fetched as concurrent skip windows, or by
+        following the search_after cursor in the Link header once they go past
+        max_skip. All requests share one pooled session and the class rate limiter.
 
         Args:
             user_keyword (str): The keyword to search for in the Open FDA API.
             keyword_domain (str): The domain to search within (e.g., "disease" or "drug").
-            limit (int): The maximum number of results to return.
+            limit (int, optional): The maximum number of results to return. Defaults to all matching results.
             timeout (int, optional): The maximum number of seconds to wait for the request to complete. Defaults to 5.
             max_retries (int, optional): The maximum number of times to retry the request if it fails. Defaults to 3.
+            search (str, optional): A prebuilt search expression sent instead of the keyword search.
 
         Returns:
-            list: A list of dictionaries containing the extracted data, or None if the request fails.
+            dict: Column name -> list of cleaned values (see Filter_Parser_Data.compile_openfda_projector),
+                or None if the request fails.
         """
-        if limit is not None and limit > 1000:
-            limit = 1000
-
-        api_url = Open_FDA.open_fda_url_selection(user_keyword, keyword_domain, limit)
-        needed_column_names = {
-            'adverse_reactions',
-            'application_number',
-            'brand_name',
-            'clinical_pharmacology',
-            'clinical_studies',
-            'contraindications',
-            'description',
-            'dosage_and_administration',
-            'drug_interactions',
-            'generic_name',
-            'how_supplied',
-            'indications_and_usage',
-            'information_for_patients',
-            'is_original_packager',
-            'manufacturer_name',
-            'mechanism_of_action',
-            'pharm_class_cs',
-            'pharm_class_epc',
-            'pharm_class_moa',
-            'pharmacodynamics',
-            'pharmacokinetics',
-            'product_type',
-            'route',
-            'substance_name',
-            'upc',
-            'warnings',
-            'warnings_and_cautions',
-            'laboratory_tests',
-            'drug_interactions',
-            'precautions',
-            'adverse_reactions'
-            }       
-        
-        for retry in range(max_retries):
-            try:
-                timeout_occurred = False
-                response = requests.get(api_url, timeout=timeout)
-                response.raise_for_status()
-                if response.status_code == 200:
-                    data = response.json()
-                    api_data = []
-                    for current_data in data["results"]:
-                        api_unit_data = {}
-                        for key, value in current_data.items():
-                            if key == "openfda":
-                                for openfda_key, openfda_value in value.items():
-                                    if openfda_key in needed_column_names:
-                                        api_unit_data[openfda_key] = (
-                                            Filter_Parser_Data.clean_openfda_value(
-                                                openfda_value
-                                            )
-                                        )
-                            else:
-                                if key in needed_column_names:
-                                    api_unit_data[key] = (
-                                        Filter_Parser_Data.clean_openfda_value(value)
-                                    )
-                        api_data.append(api_unit_data)
-                    return api_data
-            except requests.exceptions.Timeout:
-                timeout_occurred = True
-                print(
-                    f"Request timed out (attempt {retry+1}/{max_retries}). Retrying..."
-                )
-            except requests.exceptions.RequestException as e:
-                print("Error:", e)
-                break
-            if not timeout_occurred:
-                break
-        return None
+        client = get_http_client()
+        page_size = Open_FDA.page_size
+
+        def get(api_url):
+            return client.get(api_url, timeout=timeout, max_retries=max_retries, rate_limiter=Open_FDA.rate_limiter)
+
+        def fetch(page_limit, skip):
+            api_url = Open_FDA.open_fda_url_selection(user_keyword, keyword_domain, page_limit, skip, search)
+            return Open_FDA.project_records(json_loads(get(api_url).content)["results"])
+
+        def extend(page):
+            for column, values in page.items():
+                api_data[column].extend(values)
+            return len(next(iter(page.values()), []))
+
+        try:
+            first_limit = page_size if limit is None else min(limit, page_size)
+            response = get(Open_FDA.open_fda_url_selection(user_keyword, keyword_domain, first_limit, search=search))
+            data = json_loads(response.content)
+            total = data["meta"]["results"]["total"]
+            if limit is not None:
+                total = min(total, limit)
+            api_data = Open_FDA.project_records(data["results"])
+            n_rows = len(data["results"])
+            del data
+
+            if total > n_rows and total <= Open_FDA.max_skip + page_size:
+                # Independent skip windows, fetched concurrently
+                skips = range(n_rows, total, page_size)
+                with ThreadPoolExecutor(max_workers=Open_FDA.concurrency) as executor:
+                    for page in executor.map(lambda skip: fetch(min(page_size, total - skip), skip), skips):
+                        n_rows += extend(page)
+            elif total > n_rows:
+                # Beyond the skip cap only the search_after cursor works, one page at a time
+                api_url = response.links.get("next", {}).get("url")
+                while api_url and n_rows < total:
+                    response = get(api_url)
+                    n_rows += extend(Open_FDA.project_records(json_loads(response.content)["results"]))
+                    api_url = response.links.get("next", {}).get("url")
+
+            return {column: values[:total] for column, values in api_data.items()}
+        except requests.exceptions.HTTPError as e:
+            if e.response is not None and e.response.status_code == 404:
+                return Open_FDA.project_records([])  # Open FDA answers 404 when nothing matches
+            print("Error:", e)
+            return None
+        except requests.exceptions.RequestException as e:
+            print("Error:", e)
+            return None
+
+    @staticmethod
+    def drug_name_searches(names):
+        """
+        Build openFDA search expressions matching labels that carry any of the given exact names.
+
+        Args:
+            names (dict): field -> list of exact names, as returned by DrugSynonyms.matching_names.
+
+        Returns:
+            list: Search expressions of ``openfda.<field>.exact:"<name>"`` clauses joined by OR ('+'),
+                each at most max_search_length characters long.
+        """
+        searches, clauses, length = [], [], 0
+        for field, field_names in names.items():
+            for name in field_names:
+                clause = f'openfda.{field}.exact:"{quote(name, safe="")}"'
+                if clauses and length + len(clause) + 1 > Open_FDA.max_search_length:
+                    searches.append("+".join(clauses))
+                    clauses, length = [], 0
+                clauses.append(clause)
+                length += len(clause) + 1
+        if clauses:
+            searches.append("+".join(clauses))
+        return searches
+
+    @staticmethod
+    def open_fda_names_data(names):
+        """
+        Fetch the labels carrying any of the given exact brand/generic names.
+
+        Args:
+            names (dict): field -> list of exact names, as returned by DrugSynonyms.matching_names.
+
+        Returns:
+            dict: Column name -> list of values as from open_fda_data, or None if a request fails.
+        """
+        searches = Open_FDA.drug_name_searches(names)
+        data = None
+        for search in searches:
+            page = Open_FDA.open_fda_data(None, "drug", search=search)
+            if page is None:
+                return None
+            if data is None:
+                data = page
+            else:
+                for column, values in page.items():
+                    data[column].extend(values)
+        if len(searches) > 1:
+            # A label carrying names from two different requests is returned by both
+            columns = list(data)
+            rows = list(dict.fromkeys(zip(*data.values())))
+            data = {column: [row[i] for row in rows] for i, column in enumerate(columns)}
+        return data
+
+    # Section headers the label text starts with, per column
+    columns_to_clean = {
+        'description': 'Description',
+        'clinical_pharmacology': 'Clinical Pharmacology',
+        'indications_and_usage': 'Indications and Usage',
+        'contraindications': 'Contraindications',
+        'information_for_patients': 'Information for Patients',
+        'drug_interactions': 'Drug Interactions',
+        'adverse_reactions': 'Adverse Reactions',
+        'dosage_and_administration': 'Dosage and Administration',
+        'how_supplied': 'How Supplied',
+        'pharmacokinetics': 'Pharmacokinetics',
+        'warnings_and_cautions': 'Warnings and Cautions',
+        'clinical_studies': 'Clinical Studies',
+        'pharmacodynamics': 'Pharmacodynamic Drug Interaction Studies',
+        'precautions': 'PRECAUTIONS',
+        'warnings': 'WARNINGS',
+    }
+    # The header, optionally preceded by up to two words such as a section number ("5.1 WARNINGS:")
+    header_patterns = {
+        column: re.compile(r'^((?:\S+\s+){0,2})' + re.escape(header) + r'\s*:?\s*', re.IGNORECASE)
+        for column, header in columns_to_clean.items()
+    }
 
     @staticmethod
     def remove_column_headers_from_text(df):
-        columns_to_clean = {
-            'description': 'Description',
-            'clinical_pharmacology': 'Clinical Pharmacology',
-            'indications_and_usage': 'Indications and Usage',
-            'contraindications': 'Contraindications',
-            'information_for_patients': 'Information for Patients',
-            'drug_interactions': 'Drug Interactions',
-            'adverse_reactions': 'Adverse Reactions',
-            'dosage_and_administration': 'Dosage and Administration',
-            'how_supplied': 'How Supplied',
-            'pharmacokinetics': 'Pharmacokinetics',
-            'warnings_and_cautions': 'Warnings and Cautions',
-            'clinical_studies': 'Clinical Studies',
-            'pharmacodynamics': 'Pharmacodynamic Drug Interaction Studies',
-            'precautions' : 'PRECAUTIONS',
-            'drug_interactions' : 'Drug Interactions',
-            'warnings' : 'WARNINGS',
-            'adverse_reactions' : 'ADVERSE REACTIONS'
-        }
-    
-        for column, header in columns_to_clean.items():
+        """
+        Strip the leading section header (e.g. "1 INDICATIONS AND USAGE") from the narrative columns.
+
+        Each column is cleaned in a single pass with its precompiled pattern;
+        non-string cells are left untouched.
+
+        Args:
+            df (pd.DataFrame): The Open FDA label DataFrame.
+
+        Returns:
+            pd.DataFrame: The DataFrame with the headers removed.
+        """
+        for column, pattern in Open_FDA.header_patterns.items():
             if column in df.columns:
-                pattern = r'^((?:\S+\s+){0,2})' + re.escape(header) + r'\s*:?\s*'
-                
-                def clean_text(text):
-                    if isinstance(text, str):
-                        match = re.match(pattern, text, flags=re.IGNORECASE)
-                        if match:
-                            preceding = match.group(1).strip()
-                            if len(preceding.split()) <= 2:
-                                return text[match.end():].strip()
-                    return text  # Return original text if no match or > 2 preceding words
-                
-                df[column] = df[column].apply(clean_text)
-        
+                match = pattern.match
+                cleaned = []
+                for text in df[column].tolist():
+                    found = match(text) if isinstance(text, str) else None
+                    cleaned.append(text[found.end():].strip() if found else text)
+                df[column] = pd.Series(cleaned, index=df.index, dtype=object)
+
         return df
 
     @staticmethod
-    def open_fda_main(user_keyword: str, domain: str):
+    def open_fda_main(user_keyword: str, domain: str, store=None, lazy=False, synonyms=None):
         """
         Fetch and process data from the Open FDA API for the given keyword and domain, and return a pandas DataFrame containing the extracted data.
 
         Args:
             user_keyword (str): The keyword to search for in the Open FDA API.
             domain (str): The domain to search within (e.g., "disease" or "drug").
+            store (label_store.LabelStore, optional): A local label mirror. If it holds an
+                imported bulk download, the search runs against it instead of the API.
+            lazy (bool, optional): Park the heavy_columns in a lazy_columns.LazyColumns store instead
+                of keeping them in the DataFrame; their headers are stripped when they are materialized.
+                Defaults to False.
+            synonyms (drug_synonyms.DrugSynonyms, optional): A name index. For drug searches, the
+                brand/generic names containing the keyword are looked up locally and only the labels
+                carrying them are requested (or read from ``store``), instead of a loose search filtered
+                afterwards. Keywords matching more than max_expanded_names names use the loose search.
 
         Returns:
             pd.DataFrame: A pandas DataFrame containing the fetched and processed data, or None if the request fails.
+                With ``lazy``, a tuple (DataFrame or None, LazyColumns or None).
         """
-        total_rows = Open_FDA.total_rows_in_openfda(user_keyword, domain)
-        open_fda_data = Open_FDA.open_fda_data(user_keyword, domain, total_rows)
-        df = pd.DataFrame(open_fda_data)
-        if domain == 'drug':
+        names = synonyms.matching_names(user_keyword) if domain == 'drug' and synonyms is not None else None
+        if names and sum(map(len, names.values())) > Open_FDA.max_expanded_names:
+            names = None
+        if store is not None and store.import_date():
+            open_fda_data = store.search(user_keyword, domain, names=names)
+        elif names:
+            open_fda_data = Open_FDA.open_fda_names_data(names)
+        else:
+            open_fda_data = Open_FDA.open_fda_data(user_keyword, domain)
+        if open_fda_data is None:
+            return (None, None) if lazy else None
+        # Fields that no label carries are dropped, as they never became columns before
+        df = pd.DataFrame(open_fda_data).dropna(axis=1, how='all')
+        del open_fda_data
+        if df.empty:
+            return (pd.DataFrame(), None) if lazy else pd.DataFrame()
+        if domain == 'drug' and not names:
+            # Labels fetched by exact name already carry a name containing the keyword; the loose search needs filtering
             df = df[
                     df['brand_name'].str.lower().str.contains(user_keyword.lower(), na=False) | 
                     df['generic_name'].str.lower().str.contains(user_keyword.lower(), na=False)
                 ]
-            
-        df = Open_FDA.remove_column_headers_from_text(df)
 
         df = df.dropna(subset=['brand_name', 'generic_name'], how='all')
+
+        lazy_store = None
+        if lazy:
+            df, lazy_store = split_lazy_columns(
+                df, Open_FDA.heavy_columns, transform=Open_FDA.remove_column_headers_from_text
+            )
+
+        df = Open_FDA.remove_column_headers_from_text(df)
+
         # List the columns you want to move to the front
         columns_to_front = ['brand_name', 'generic_name', 'manufacturer_name', 'application_number', 'indications_and_usage']
 
         # Reorder the columns by combining the selected columns with the remaining ones
         df = df[columns_to_front + [col for col in df.columns if col not in columns_to_front]]
         
-        return df
+        return (df, lazy_store) if lazy else df
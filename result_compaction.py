@@ -0,0 +1,139 @@
+import os
+
+import pandas as pd
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Tokens the code output and result frame may take up in the summary prompt together
+DEFAULT_TOKEN_BUDGET = int(os.environ.get("SUMMARY_TOKEN_BUDGET", 8000))
+
+_encoding = None
+
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None:
+        try:
+            _encoding = tiktoken.get_encoding("o200k_base")
+        except Exception as e:  # the encoding is downloaded on first use
+            print("Token encoding unavailable, estimating tokens from length:", e)
+            _encoding = False
+    return _encoding
+
+
+def estimate_tokens(text):
+    """Count the gpt-4o tokens of a text, or estimate them as 4 characters per token without tiktoken."""
+    encoding = _get_encoding() if tiktoken is not None else False
+    if not encoding:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_text(text, budget):
+    """
+    Shorten a text to about ``budget`` tokens by dropping lines from its middle.
+
+    Printed results usually put headers and totals at the start and end, so
+    both are kept and a marker says how many lines were left out.
+    """
+    if estimate_tokens(text) <= budget:
+        return text
+    lines = text.splitlines()
+    head, tail = [], []
+    used = 0
+    for i in range(len(lines)):
+        line = lines[i // 2] if i % 2 == 0 else lines[-(i // 2) - 1]
+        cost = estimate_tokens(line) + 1
+        if used + cost > budget or len(head) + len(tail) >= len(lines):
+            break
+        (head if i % 2 == 0 else tail).append(line)
+        used += cost
+    if not head:
+        # One very long line: keep its start
+        return text[:budget * 4] + " ... [truncated]"
+    omitted = len(lines) - len(head) - len(tail)
+    return "\n".join(head + [f"... [{omitted} lines omitted] ..."] + tail[::-1])
+
+
+def describe_columns(df, top_k=5):
+    """One line per column: null counts and, depending on the type, range, mean or most frequent values."""
+    lines = []
+    for i, column in enumerate(df.columns):
+        # By position, as df[column] is a frame when the name is duplicated
+        series = df.iloc[:, i]
+        text = f"- {column} ({series.dtype}): {series.notna().sum()} non-null"
+        if pd.api.types.is_bool_dtype(series) or not (
+            pd.api.types.is_numeric_dtype(series) or pd.api.types.is_datetime64_any_dtype(series)
+        ):
+            try:
+                counts = series.value_counts(dropna=True)
+            except TypeError:  # unhashable cells such as lists
+                counts = series.astype(str).value_counts(dropna=True)
+            text += f", {len(counts)} distinct"
+            if len(counts):
+                text += "; top: " + ", ".join(f"{str(value)[:60]!r}: {count}" for value, count in counts.head(top_k).items())
+        elif pd.api.types.is_datetime64_any_dtype(series):
+            text += f", from {series.min()} to {series.max()}"
+        elif series.notna().any():
+            text += (f", min {series.min():.6g}, mean {series.mean():.6g}, "
+                     f"median {series.median():.6g}, max {series.max():.6g}, sum {series.sum():.6g}")
+        lines.append(text)
+    return "\n".join(lines)
+
+
+def describe_frame(df, budget, top_k=5, max_colwidth=80):
+    """
+    Describe a DataFrame within about ``budget`` tokens: its shape, per-column
+    statistics and as many evenly spaced sample rows as still fit.
+    """
+    header = f"{len(df)} rows x {len(df.columns)} columns. Column statistics:\n{describe_columns(df, top_k)}"
+    header = truncate_text(header, budget * 2 // 3)
+    rows = min(len(df), 50)
+    while rows > 0:
+        # Evenly spaced rows keep sorted results representative from top to bottom
+        positions = sorted({round(i * (len(df) - 1) / max(rows - 1, 1)) for i in range(rows)})
+        with pd.option_context("display.max_colwidth", max_colwidth, "display.width", None,
+                               "display.max_columns", None, "display.max_rows", None):
+            sample = df.iloc[positions].to_string()
+        text = f"{header}\nSample of {len(positions)} rows:\n{sample}"
+        if estimate_tokens(text) <= budget:
+            return text
+        rows //= 2
+    return header
+
+
+def compact_result(output, df, budget=DEFAULT_TOKEN_BUDGET):
+    """
+    Fit the printed output and the result frame of generated code into the summary prompt.
+
+    Results that fit in ``budget`` tokens are returned unchanged. Otherwise the
+    frame is replaced with describe_frame's statistics and sample, and the
+    output is cut down to its first and last lines.
+
+    Args:
+        output (str): What the code printed.
+        df (pd.DataFrame): The result frame, or None.
+        budget (int, optional): Tokens for both together. Defaults to DEFAULT_TOKEN_BUDGET
+            (SUMMARY_TOKEN_BUDGET environment variable, 8000).
+
+    Returns:
+        tuple: (output text, frame text, whether anything was compacted).
+    """
+    output = "" if output is None else str(output)
+    data = str(df)
+    output_tokens, data_tokens = estimate_tokens(output), estimate_tokens(data)
+    if output_tokens + data_tokens <= budget:
+        return output, data, False
+
+    if isinstance(df, pd.DataFrame):
+        # Split the budget between the two, letting one use what the other does not need
+        data_budget = max(budget - min(output_tokens, budget // 2), budget // 2)
+        data = describe_frame(df, data_budget)
+        data_tokens = estimate_tokens(data)
+    else:
+        data = truncate_text(data, budget // 2)
+        data_tokens = estimate_tokens(data)
+    return truncate_text(output, max(budget - data_tokens, budget // 4)), data, True
@@ -0,0 +1,443 @@
+import multiprocessing
+import os
+import pickle
+import queue
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import traceback
+import weakref
+from collections import OrderedDict
+from io import StringIO
+
+import pandas as pd
+
+from clinical_trials_module import copy_lookups
+from text_index import TextIndex
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+try:
+    import resource
+except ImportError:  # not available on Windows; workers then run without a memory cap
+    resource = None
+
+
+def code_namespace(code, data, df_ct=None, df_fda=None, ct_tables=None, ct_lookup=None, fda_lazy=None,
+                   search=None, drug_lookup=None, copy=False):
+    """
+    Build the variables generated code runs with.
+
+    Args:
+        code (str): The code to run; parked FDA columns it names are loaded into ``df_fda`` first.
+        data (list): The selected DataFrame names, e.g. ['clinical_trials_df'].
+        df_ct, df_fda (pd.DataFrame, optional): The clinical trials and Open FDA DataFrames.
+        ct_tables (dict, optional): Companion clinical trials tables by name.
+        ct_lookup (dict, optional): Exact-match clinical trials lookups.
+        fda_lazy (lazy_columns.LazyColumns, optional): The parked heavy FDA columns.
+        search (callable, optional): TextIndex.search of the frames above.
+        drug_lookup (callable, optional): DrugSynonyms.lookup.
+        copy (bool, optional): Hand the code shallow copies of the frames and a copy of
+            ``ct_lookup``, so changes it makes do not outlive the run. Defaults to False.
+
+    Returns:
+        dict: Variable name -> value.
+    """
+    frame = (lambda df: df.copy(deep=False) if copy and df is not None else df)
+    local_vars = {'pd': pd,
+                  '__builtins__': __builtins__,
+                  'search': search,
+                }
+
+    if "clinical_trials_df" in data:
+        local_vars["clinical_trials_df"] = frame(df_ct)
+        # Companion long-format tables and exact-match lookups
+        for table_name, table_df in (ct_tables or {}).items():
+            local_vars[f"ct_{table_name}_df"] = frame(table_df)
+        local_vars["ct_lookup"] = copy_lookups(ct_lookup) if copy else ct_lookup or {}
+    if "FDA_drugs_df" in data:
+        # Load the parked label sections this code refers to, once per frame
+        if fda_lazy is not None and df_fda is not None:
+            fda_lazy.materialize(df_fda, fda_lazy.referenced(df_fda, code))
+        local_vars["FDA_drugs_df"] = frame(df_fda)
+        if drug_lookup is not None:
+            local_vars["drug_lookup"] = drug_lookup
+    return local_vars
+
+
+def run_code(code, local_vars):
+    """Executes Python code with given context and prevents pandas truncation"""
+
+    # Set pandas display options
+    pd.set_option('display.max_rows', None)
+    pd.set_option('display.max_columns', None)
+    pd.set_option('display.width', None)
+    pd.set_option('display.max_colwidth', None)
+
+    old_stdout = sys.stdout
+    sys.stdout = StringIO()
+
+    try:
+        # Store initial variables
+        initial_vars = set(local_vars.keys())
+
+        exec(code, local_vars)
+
+        # Find all new DataFrame variables
+        new_vars = set(local_vars.keys()) - initial_vars
+        df_vars = {var: local_vars[var] for var in new_vars
+                if isinstance(local_vars[var], pd.DataFrame)}
+
+        # Get the last DataFrame created (if any exist)
+        result_df = None
+        if df_vars:
+            # Get the last DataFrame from the execution
+            last_df_name = re.findall(r'\b\w+_df\b', code)[-1]
+            result_df = df_vars[last_df_name]
+            print(f"\nCapturing DataFrame: '{last_df_name}'")
+
+
+        output = sys.stdout.getvalue()
+        return {
+                "output": output,
+                "error": None,
+                "result_df": result_df,
+                "all_dataframes": df_vars,  # Optional: return all DataFrames if needed
+                "last_df_name": last_df_name
+            }
+    except Exception:
+        return error_result(traceback.format_exc())
+    finally:
+        # Reset stdout and pandas options
+        sys.stdout = old_stdout
+        pd.reset_option('display.max_rows')
+        pd.reset_option('display.max_columns')
+        pd.reset_option('display.width')
+        pd.reset_option('display.max_colwidth')
+
+
+def error_result(error):
+    """Return a run_code result for code that failed with ``error``."""
+    return {
+        "output": None,
+        "error": str(error),
+        "result_df": None,
+        "all_dataframes": {},
+        "last_df_name": None
+    }
+
+
+def _write_frame(directory, name, df):
+    """Write a DataFrame as an Arrow IPC file, or pickle it if Arrow cannot represent its columns."""
+    if pa is not None:
+        try:
+            table = pa.Table.from_pandas(df)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            pass
+        else:
+            with pa.OSFile(os.path.join(directory, f"{name}.arrow"), "wb") as sink, \
+                    pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+            return
+    df.to_pickle(os.path.join(directory, f"{name}.pickle"))
+
+
+def _read_frame(directory, name):
+    path = os.path.join(directory, f"{name}.arrow")
+    if os.path.exists(path):
+        table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+        columns = [column for column in table.schema.pandas_metadata["columns"]
+                   if column["field_name"] in table.column_names]
+        # pandas string columns would come back as Python objects; wrap the mapped buffers instead
+        strings = [column for column in columns if column["numpy_type"] == "string"]
+        df = table.drop_columns([column["field_name"] for column in strings]).to_pandas()
+        for column in strings:
+            df[column["name"]] = pd.arrays.ArrowStringArray(table.column(column["field_name"]))
+        return df[[column["name"] for column in columns if column["name"] in df.columns]]
+    return pd.read_pickle(os.path.join(directory, f"{name}.pickle"))
+
+
+def export_session(session, directory):
+    """
+    Write the data of a workflow.SessionData to ``directory`` for the sandbox workers.
+
+    Every DataFrame becomes its own Arrow IPC file; the remaining small
+    objects (lookups, the parked-column store and the frame names) go to a
+    single meta.pickle.
+    """
+    frames = {"clinical_trials_df": session.df_ct, "FDA_drugs_df": session.df_fda}
+    frames.update({f"ct_{name}_df": table for name, table in session.ct_tables.items()})
+    for name, df in frames.items():
+        if df is not None:
+            _write_frame(directory, name, df)
+    meta = {
+        "frames": {name: df is not None for name, df in frames.items()},
+        "ct_tables": list(session.ct_tables),
+        "ct_lookup": session.ct_lookup,
+        "fda_lazy": session.fda_lazy,
+    }
+    with open(os.path.join(directory, "meta.pickle"), "wb") as f:
+        pickle.dump(meta, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+class _WorkerData:
+    """A session's data as loaded by a worker, reused for every run against the same export."""
+
+    def __init__(self, directory):
+        with open(os.path.join(directory, "meta.pickle"), "rb") as f:
+            meta = pickle.load(f)
+        self.frames = {name: _read_frame(directory, name) if present else None
+                       for name, present in meta["frames"].items()}
+        self.ct_tables = {name: self.frames[f"ct_{name}_df"] for name in meta["ct_tables"]}
+        self.ct_lookup = meta["ct_lookup"]
+        self.fda_lazy = meta["fda_lazy"]
+        # Text columns are indexed on their first search in this worker
+        self.text_index = TextIndex()
+        self.text_index.register("clinical_trials_df", self.frames["clinical_trials_df"], columns=[])
+        self.text_index.register("FDA_drugs_df", self.frames["FDA_drugs_df"], columns=[], lazy=self.fda_lazy)
+
+    def namespace(self, code, data, drug_lookup):
+        return code_namespace(
+            code, data,
+            df_ct=self.frames["clinical_trials_df"],
+            df_fda=self.frames["FDA_drugs_df"],
+            ct_tables=self.ct_tables,
+            ct_lookup=self.ct_lookup,
+            fda_lazy=self.fda_lazy,
+            search=self.text_index.search,
+            drug_lookup=drug_lookup,
+            copy=True,
+        )
+
+
+def _worker_main(conn, memory_limit, drug_synonyms, keep_datasets=4):
+    """Serve (code, export directory, dfs) requests from ``conn`` until it is closed."""
+    if memory_limit and resource is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+    # As in the app (CT_FDA_DeepSeek.py): writes through the per-run shallow copies never reach the loaded frames
+    pd.options.mode.copy_on_write = True
+    drug_lookup = drug_synonyms.lookup if drug_synonyms is not None else None
+    datasets = OrderedDict()  # export directory -> _WorkerData, least recently used first
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            return
+        if request is None:
+            return
+        code, directory, data = request
+        try:
+            dataset = datasets.pop(directory, None) or _WorkerData(directory)
+        except Exception:
+            conn.send(error_result(traceback.format_exc()))
+            continue
+        datasets[directory] = dataset
+        while len(datasets) > keep_datasets:
+            datasets.popitem(last=False)
+
+        result = run_code(code, dataset.namespace(code, data, drug_lookup))
+        result["all_dataframes"] = {}  # only the result frame is sent back
+        try:
+            conn.send(result)
+        except Exception:
+            conn.send(error_result(traceback.format_exc()))
+
+
+class SandboxPool:
+    """Pre-warmed worker processes that run generated code outside the app's process.
+
+    A session's DataFrames are exported once to Arrow IPC files (export_session);
+    each worker memory-maps an export the first time it runs code against it
+    and keeps the loaded frames for later runs, so a run only sends the code
+    and the export's path. Runs get their own stdout and pandas options, are
+    killed after ``timeout`` seconds and fail with MemoryError beyond
+    ``memory_limit`` bytes; a killed or crashed worker is replaced. Results
+    have the shape of run_code's, without ``all_dataframes``.
+
+    Workers are started with the "spawn" method, so the app must not be the
+    ``__main__`` module of the process (``streamlit run`` takes care of that).
+    """
+
+    def __init__(self, workers=2, timeout=60, memory_limit=4 << 30, drug_synonyms=None, max_exports=16):
+        """
+        Args:
+            workers (int, optional): Worker processes, i.e. runs at the same time. Defaults to 2.
+            timeout (float, optional): Wall-clock seconds a run may take. Defaults to 60.
+            memory_limit (int, optional): Address-space cap of each worker in bytes, None for no cap. Defaults to 4 GiB.
+            drug_synonyms (drug_synonyms.DrugSynonyms, optional): Sent to each worker once for ``drug_lookup``.
+            max_exports (int, optional): Session exports kept on disk. Defaults to 16.
+        """
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.drug_synonyms = drug_synonyms
+        self.max_exports = max_exports
+        self._context = multiprocessing.get_context("spawn")
+        self._root = tempfile.mkdtemp(prefix="sandbox_")
+        self._finalizer = weakref.finalize(self, shutil.rmtree, self._root, True)
+        # key -> (directory, objects the key is built from); holding them keeps their ids from being reused
+        self._exports = OrderedDict()
+        self._lock = threading.Lock()
+        self._export_lock = threading.Lock()
+        self._idle = queue.Queue()
+        self._workers = []
+        self.runs = 0
+        self.timeouts = 0
+        self.crashes = 0
+        for _ in range(workers):
+            self._idle.put(self._start_worker())
+
+    def _start_worker(self):
+        conn, child_conn = self._context.Pipe()
+        process = self._context.Process(
+            target=_worker_main, args=(child_conn, self.memory_limit, self.drug_synonyms), daemon=True
+        )
+        process.start()
+        child_conn.close()
+        with self._lock:
+            self._workers.append(process)
+        return process, conn
+
+    def _stop_worker(self, process, conn):
+        process.kill()
+        process.join()
+        conn.close()
+        with self._lock:
+            self._workers.remove(process)
+
+    def _export(self, session):
+        """
+        Return the export directory of a session's data, writing it on first use.
+
+        Sessions copied from the same shared values (SessionData.data_source,
+        e.g. one DataCache entry) use the same export; others are told apart
+        by their own frames.
+        """
+        if session.data_source:
+            names = sorted(session.data_source)
+            objects = tuple(session.data_source[name] for name in names)
+        else:
+            names = list(session.ct_tables)
+            objects = (session.df_ct, session.df_fda, session.fda_lazy, session.ct_lookup or None,
+                       *session.ct_tables.values())
+        key = (*names, *(id(obj) for obj in objects))
+        with self._export_lock:
+            with self._lock:
+                if key in self._exports:
+                    self._exports.move_to_end(key)
+                    return self._exports[key][0]
+            directory = tempfile.mkdtemp(dir=self._root)
+            try:
+                export_session(session, directory)
+            except BaseException:
+                shutil.rmtree(directory, ignore_errors=True)
+                raise
+            with self._lock:
+                self._exports[key] = (directory, objects)
+                while len(self._exports) > self.max_exports:
+                    # Workers that still have this export loaded keep their copy
+                    shutil.rmtree(self._exports.popitem(last=False)[1][0], ignore_errors=True)
+            return directory
+
+    def run(self, code, data, session):
+        """
+        Run generated code against a session's data in a worker process.
+
+        Args:
+            code (str): The code to run.
+            data (list): The selected DataFrame names.
+            session (workflow.SessionData): The asking session.
+
+        Returns:
+            dict: The run_code result; timeouts and worker crashes are reported in ``error``.
+        """
+        directory = self._export(session)
+        process, conn = self._idle.get()
+        healthy = False
+        try:
+            conn.send((code, directory, list(data)))
+            if conn.poll(self.timeout):
+                result = conn.recv()
+                healthy = True
+            else:
+                with self._lock:
+                    self.timeouts += 1
+                result = error_result(
+                    f"TimeoutError: the code did not finish within {self.timeout} seconds and was stopped. "
+                    "Avoid row-by-row loops and joins that multiply rows."
+                )
+        except (EOFError, OSError):
+            with self._lock:
+                self.crashes += 1
+            process.join(1)
+            result = error_result(
+                f"The process running the code exited unexpectedly (exit code {process.exitcode}), "
+                "most likely because it ran out of memory."
+            )
+        finally:
+            if not healthy:
+                self._stop_worker(process, conn)
+                process, conn = self._start_worker()
+            self._idle.put((process, conn))
+        with self._lock:
+            self.runs += 1
+        return result
+
+    def stats(self):
+        """Return run counters and the number of live workers and exports as a dict."""
+        with self._lock:
+            return {
+                'workers': sum(process.is_alive() for process in self._workers),
+                'exports': len(self._exports),
+                'runs': self.runs,
+                'timeouts': self.timeouts,
+                'crashes': self.crashes,
+                'timeout': self.timeout,
+                'memory_limit': self.memory_limit,
+            }
+
+    def close(self):
+        """Stop the workers and delete the exports."""
+        with self._lock:
+            workers = list(self._workers)
+        for process in workers:
+            process.kill()
+            process.join()
+        with self._lock:
+            self._workers.clear()
+            self._exports.clear()
+        self._finalizer()
+
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+
+def get_sandbox_pool(drug_synonyms=None):
+    """
+    Return the process-wide SandboxPool, creating it on first use.
+
+    The pool size, time limit and memory cap come from the SANDBOX_WORKERS
+    (default 2), SANDBOX_TIMEOUT (seconds, default 60) and SANDBOX_MEMORY_MB
+    (default 4096, 0 for no cap) environment variables. With SANDBOX_WORKERS=0
+    no pool is created and None is returned, so code runs in this process.
+
+    Args:
+        drug_synonyms (drug_synonyms.DrugSynonyms, optional): Used by the pool's workers; only
+            the value passed on the first call counts.
+    """
+    global _default_pool
+    with _default_pool_lock:
+        workers = int(os.environ.get("SANDBOX_WORKERS", 2))
+        if _default_pool is None and workers > 0:
+            _default_pool = SandboxPool(
+                workers=workers,
+                timeout=float(os.environ.get("SANDBOX_TIMEOUT", 60)),
+                memory_limit=int(os.environ.get("SANDBOX_MEMORY_MB", 4096)) << 20 or None,
+                drug_synonyms=drug_synonyms,
+            )
+        return _default_pool
@@ -0,0 +1,147 @@
+import math
+import re
+
+from context import clinical_trial_context, fda_context
+
+ENTRY_RE = re.compile(r"^-(\w+):\s*(.*)$")
+WORD_RE = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+")
+
+STOPWORDS = {
+    'a', 'about', 'all', 'an', 'and', 'any', 'are', 'as', 'at', 'be', 'by', 'can', 'did', 'do', 'does', 'e', 'eg',
+    'etc', 'for', 'from', 'g', 'give', 'has', 'have', 'how', 'i', 'in', 'is', 'it', 'its', 'like', 'list', 'many',
+    'me', 'most', 'much', 'of', 'on', 'or', 'show', 'such', 'than', 'that', 'the', 'their', 'there', 'these', 'this',
+    'those', 'to', 'was', 'were', 'what', 'when', 'where', 'which', 'who', 'whose', 'with',
+}
+SUFFIXES = ('ation', 'ion', 'ing', 'er', 'ed', 'e')
+
+# Columns described in every prompt: identifiers and the fields most questions filter or report on
+CORE_COLUMNS = {
+    'clinical_trials_df': ['nctId', 'briefTitle', 'overallStatus', 'phases', 'conditions', 'interventionDrug'],
+    'FDA_drugs_df': ['brand_name', 'generic_name', 'manufacturer_name', 'indications_and_usage'],
+}
+
+
+def stem(word):
+    """Strip a plural 's' and one common suffix, so e.g. 'interacts' and 'interactions' both become 'interact'."""
+    if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+        word = word[:-1]
+    for suffix in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 4:
+            return word[:-len(suffix)]
+    return word
+
+
+def tokenize(text):
+    """Lower-case word stems of a text; camelCase and snake_case names are split into their words."""
+    return {stem(word) for word in map(str.lower, WORD_RE.findall(text)) if word not in STOPWORDS}
+
+
+class ContextIndex:
+    """The column descriptions of one context.py string, tokenized once so a prompt can carry only the relevant ones.
+
+    The string is split into the lines before the column list (kept in every
+    prompt), one ``-column: description`` line per column and, after the first
+    blank line, a trailing section (such as the companion tables) that is also
+    kept in every prompt, as questions rarely name the columns it stands in
+    for. Matches are weighted by how rare a word is among the descriptions,
+    and a word in a column's name counts double; a column also has to score
+    at least half as well as the best match.
+    """
+
+    def __init__(self, text, core_columns=(), max_columns=12, min_score=2.0, relative_score=0.5):
+        """
+        Args:
+            text (str): A context.py description string.
+            core_columns (list, optional): Columns always described.
+            max_columns (int, optional): Further columns described at most. Defaults to 12.
+            min_score (float, optional): The relevance a column needs to be described. Defaults to 2.0.
+            relative_score (float, optional): The fraction of the best column's relevance it needs too. Defaults to 0.5.
+        """
+        self.core_columns = list(core_columns)
+        self.max_columns = max_columns
+        self.min_score = min_score
+        self.relative_score = relative_score
+        self.preamble, self.entries, trailer = [], {}, []
+        for line in text.strip("\n").splitlines():
+            match = ENTRY_RE.match(line)
+            if trailer or (self.entries and not line.strip()):
+                trailer.append(line)
+            elif match:
+                self.entries[match.group(1)] = line
+            else:
+                self.preamble.append(line)
+        self.trailer = "\n".join(trailer).strip("\n")
+
+        self.name_tokens = {name: tokenize(name) for name in self.entries}
+        self.description_tokens = {name: tokenize(line) for name, line in self.entries.items()}
+        self.trailer_tokens = tokenize(self.trailer)
+        documents = list(self.description_tokens.values()) + [self.trailer_tokens]
+        counts = {}
+        for tokens in documents:
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+        self.idf = {token: math.log(len(documents) / count) for token, count in counts.items()}
+
+    def _score(self, question_tokens, tokens, name_tokens=()):
+        return sum(self.idf.get(token, 0.0) * (2 if token in name_tokens else 1) for token in question_tokens & tokens)
+
+    def select(self, question, columns=None):
+        """
+        Return the described columns relevant to a question, in context.py order.
+
+        Args:
+            question (str): The user's question.
+            columns (list, optional): The DataFrame's actual columns; described columns it lacks are left out.
+        """
+        available = set(self.entries) if columns is None else set(columns) & set(self.entries)
+        question_tokens = tokenize(question)
+        scores = {
+            name: self._score(question_tokens, self.description_tokens[name], self.name_tokens[name])
+            for name in available
+        }
+        threshold = max(self.min_score, self.relative_score * max(scores.values(), default=0.0))
+        ranked = sorted((name for name, score in scores.items() if score >= threshold), key=lambda name: -scores[name])
+        chosen = {name for name in self.core_columns if name in available} | set(ranked[:self.max_columns])
+        return [name for name in self.entries if name in chosen]
+
+    def render(self, question, columns=None):
+        """
+        Return the context string cut down to the columns relevant to ``question``.
+
+        Columns of the DataFrame that are not described are listed by name only,
+        so generated code can still use any of them.
+        """
+        selected = self.select(question, columns)
+        lines = self.preamble + [self.entries[name] for name in selected]
+        if columns is not None:
+            others = [column for column in columns if column not in selected]
+            if others:
+                lines.append(f"Other columns: {', '.join(others)}")
+        if self.trailer:
+            lines += ["", self.trailer]
+        return "\n".join(lines) + "\n"
+
+
+CONTEXT_INDEXES = {
+    'clinical_trials_df': ContextIndex(clinical_trial_context, CORE_COLUMNS['clinical_trials_df']),
+    'FDA_drugs_df': ContextIndex(fda_context, CORE_COLUMNS['FDA_drugs_df']),
+}
+
+
+def data_context_for(question, columns_by_df):
+    """
+    Build the DataFrame descriptions for a code-generation prompt.
+
+    Args:
+        question (str): The user's question.
+        columns_by_df (dict): Selected DataFrame name -> its column names.
+
+    Returns:
+        str: The relevant part of each DataFrame's context.py description, FDA first as before.
+    """
+    order = ['FDA_drugs_df', 'clinical_trials_df']
+    return "".join(
+        CONTEXT_INDEXES[name].render(question, columns_by_df[name])
+        for name in sorted(columns_by_df, key=lambda name: order.index(name) if name in order else len(order))
+        if name in CONTEXT_INDEXES
+    )
@@ -0,0 +1,324 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import date, timedelta
+
+from clinical_trials_module import (
+    CHILD_TABLES,
+    ColumnBuffer,
+    add_children,
+    build_lookups,
+    finalize_child_tables,
+    finalize_clinical_trials_frame,
+    iter_clinical_trials_pages,
+    normalize_study,
+    study_children,
+)
+
+DEFAULT_STORE_PATH = os.environ.get(
+    "CT_STORE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "clinical_trials.sqlite")
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS studies (
+    nctId TEXT PRIMARY KEY,
+    lastUpdatePostDate TEXT,
+    data TEXT NOT NULL,
+    children TEXT
+);
+CREATE TABLE IF NOT EXISTS queries (
+    term TEXT PRIMARY KEY,
+    last_sync_date TEXT NOT NULL,
+    synced_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS query_studies (
+    term TEXT NOT NULL,
+    nctId TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (term, nctId)
+);
+CREATE INDEX IF NOT EXISTS query_studies_position ON query_studies (term, position);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Normalized columns searched by local term matches, per studies_fts column. Close to
+# the fields query.term searches on the API; keywords and secondary ids are not normalized
+FTS_COLUMNS = {
+    'title': ['briefTitle', 'officialTitle'],
+    'conditions': ['conditions'],
+    'interventions': ['interventions', 'interventionDrug', 'interventionBiological', 'interventioOthers',
+                      'interventionDescription'],
+    'sponsors': ['organization', 'responsibleParty', 'leadSponsor', 'collaborators'],
+    'summary': ['briefSummary'],
+    'description': ['detailedDescription'],
+    'outcomes': ['primaryOutcomes', 'secondaryOutcomes'],
+    'eligibility': ['eligibilityCriteria'],
+    'locations': ['LocationName', 'city', 'state', 'country'],
+}
+
+
+def _fts_rowid(nct_id):
+    # studies_fts rows are keyed by the numeric part of the NCT number
+    return int(nct_id[3:]) if nct_id[3:].isdigit() else None
+
+
+def _fts_row(row):
+    rowid = _fts_rowid(row["nctId"])
+    if rowid is None:
+        return None
+    return [rowid] + [
+        " ".join(str(row[column]) for column in columns if row.get(column))
+        for columns in FTS_COLUMNS.values()
+    ]
+
+
+def _fts_insert(conn, fts_rows):
+    conn.executemany(
+        f"INSERT OR REPLACE INTO studies_fts (rowid, {', '.join(FTS_COLUMNS)}) "
+        f"VALUES ({', '.join('?' * (len(FTS_COLUMNS) + 1))})",
+        fts_rows,
+    )
+
+
+class StudyStore:
+    """An on-disk store of normalized ClinicalTrials.gov studies with incremental sync.
+
+    Normalized rows are kept in SQLite keyed by nctId, and every search term
+    is registered together with the date of its last sync. Repeating a search
+    within ``sync_interval`` seconds is answered from disk alone; after that
+    only studies whose lastUpdatePostDate is on or after the last sync date
+    are downloaded and merged in.
+
+    Once a full dump has been imported with bulk_loader.bulk_import, terms are
+    matched locally against a full-text index, after the same delta sync from
+    the dump's snapshot date has brought the studies matching the term up to date.
+    """
+
+    def __init__(self, path=DEFAULT_STORE_PATH, sync_interval=3600):
+        """
+        Args:
+            path (str, optional): Location of the SQLite file. Defaults to data/clinical_trials.sqlite
+                next to this module, or the CT_STORE_PATH environment variable.
+            sync_interval (int, optional): Seconds during which a synced term is served without
+                contacting the API. Defaults to 3600.
+        """
+        self.path = path
+        self.sync_interval = sync_interval
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+            conn.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS studies_fts USING fts5 ({', '.join(FTS_COLUMNS)})")
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(studies)")}
+            if "children" not in columns:
+                # Stores created before the companion tables existed: forget the sync
+                # dates so every term is downloaded in full once more
+                conn.execute("ALTER TABLE studies ADD COLUMN children TEXT")
+                conn.execute("DELETE FROM queries")
+            fts_columns = [row[1] for row in conn.execute("PRAGMA table_info(studies_fts)")]
+            if fts_columns != list(FTS_COLUMNS):
+                # Stores indexed with fewer columns: rebuild the index from the stored rows
+                conn.execute("DROP TABLE studies_fts")
+                conn.execute(f"CREATE VIRTUAL TABLE studies_fts USING fts5 ({', '.join(FTS_COLUMNS)})")
+                rows = (_fts_row(json.loads(data)) for (data,) in conn.execute("SELECT data FROM studies"))
+                _fts_insert(conn, [row for row in rows if row is not None])
+
+    def _connect(self):
+        # One short-lived connection per operation keeps the store usable from any thread
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    @staticmethod
+    def _term_key(COND):
+        return " ".join(str(COND).lower().split())
+
+    def upsert(self, rows, COND=None, children=None):
+        """
+        Insert or replace normalized study rows, optionally linking them to a search term.
+
+        Args:
+            rows (list): Normalized study dicts as returned by normalize_study.
+            COND (str, optional): The search term the rows were returned for.
+            children (list, optional): The study_children output for each row, in the same order.
+        """
+        children = children if children is not None else [None] * len(rows)
+        pairs = [(row, child) for row, child in zip(rows, children) if row.get("nctId")]
+        rows = [row for row, _ in pairs]
+        if not rows:
+            return
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO studies (nctId, lastUpdatePostDate, data, children) VALUES (?, ?, ?, ?)",
+                [
+                    (row["nctId"], row.get("lastUpdatePostDate"), json.dumps(row),
+                     json.dumps(child) if child is not None else None)
+                    for row, child in pairs
+                ],
+            )
+            _fts_insert(conn, [fts_row for fts_row in map(_fts_row, rows) if fts_row is not None])
+            if COND is not None:
+                term = self._term_key(COND)
+                start = conn.execute(
+                    "SELECT COALESCE(MAX(position) + 1, 0) FROM query_studies WHERE term = ?", (term,)
+                ).fetchone()[0]
+                conn.executemany(
+                    "INSERT OR IGNORE INTO query_studies (term, nctId, position) VALUES (?, ?, ?)",
+                    [(term, row["nctId"], start + i) for i, row in enumerate(rows)],
+                )
+
+    def last_sync(self, COND):
+        """Return (last_sync_date, synced_at) for a term, or None if it was never synced."""
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT last_sync_date, synced_at FROM queries WHERE term = ?", (self._term_key(COND),)
+            ).fetchone()
+
+    def _mark_synced(self, COND, sync_date):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO queries (term, last_sync_date, synced_at) VALUES (?, ?, ?)",
+                (self._term_key(COND), sync_date, time.time()),
+            )
+
+    def load(self, COND, with_children=False):
+        """
+        Return the stored studies for a term as a finalized DataFrame.
+
+        With ``with_children`` a tuple (DataFrame, companion tables, lookups) is
+        returned instead, as from clinical_trials_module.get_clinical_trials_tables.
+        """
+        return self._load(
+            "SELECT s.data, s.children FROM query_studies q JOIN studies s ON s.nctId = q.nctId "
+            "WHERE q.term = ? ORDER BY q.position",
+            (self._term_key(COND),),
+            with_children,
+        )
+
+    def search_local(self, COND, with_children=False):
+        """
+        Match a term against the locally stored studies instead of the API.
+
+        The term is looked up as a phrase in the titles, conditions,
+        interventions, sponsors, summaries and descriptions, outcomes,
+        eligibility criteria and locations (see FTS_COLUMNS), ranked by
+        relevance. Returns the same shapes as load.
+        """
+        phrase = '"' + " ".join(str(COND).split()).replace('"', '""') + '"'
+        return self._load(
+            "SELECT s.data, s.children FROM studies_fts f JOIN studies s "
+            "ON s.nctId = 'NCT' || substr('00000000' || f.rowid, -8, 8) "
+            "WHERE studies_fts MATCH ? ORDER BY f.rank",
+            (phrase,),
+            with_children,
+        )
+
+    def _load(self, sql, params, with_children):
+        buffer = ColumnBuffer()
+        child_buffers = {table: ColumnBuffer() for table in CHILD_TABLES}
+        with self._connect() as conn:
+            for data, children in conn.execute(sql, params):
+                row = json.loads(data)
+                buffer.append(row)
+                if with_children and children:
+                    add_children(child_buffers, row["nctId"], json.loads(children))
+        df = finalize_clinical_trials_frame(buffer.to_frame())
+        if not with_children:
+            return df
+        tables = finalize_child_tables(child_buffers)
+        return df, tables, build_lookups(tables)
+
+    def bulk_import_date(self):
+        """Return the snapshot date of the last imported full dump, or None if there was none."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'bulk_import_date'").fetchone()
+        return row[0] if row else None
+
+    def mark_bulk_import(self, snapshot_date):
+        """
+        Record that the store holds a full dump, so terms are matched locally from now on.
+
+        Args:
+            snapshot_date (str): The YYYY-MM-DD date the dump was taken; terms are delta-synced
+                from this date, so studies updated between the dump and its import are fetched.
+        """
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('bulk_import_date', ?)",
+                (snapshot_date,),
+            )
+
+    def sync(self, COND, client=None, since=None):
+        """
+        Bring the stored studies for a term up to date with ClinicalTrials.gov.
+
+        A term seen for the first time is downloaded in full, or from ``since``
+        when given; afterwards only studies updated since the day of the
+        previous sync are requested.
+
+        Returns:
+            int: The number of studies downloaded.
+        """
+        previous = self.last_sync(COND)
+        since = previous[0] if previous is not None else since
+        advanced_filter = None
+        if since is not None:
+            advanced_filter = f"AREA[LastUpdatePostDate]RANGE[{since},MAX]"
+
+        # Taken before fetching and one day back, so updates posted meanwhile or dated in
+        # another time zone are picked up again by the next delta
+        sync_date = (date.today() - timedelta(days=1)).isoformat()
+        fetched = 0
+        for studies in iter_clinical_trials_pages(COND, client=client, advanced_filter=advanced_filter):
+            rows = [normalize_study(study) for study in studies]
+            children = [study_children(study) for study in studies]
+            del studies
+            self.upsert(rows, COND, children)
+            fetched += len(rows)
+        self._mark_synced(COND, sync_date)
+        return fetched
+
+    def get_clinical_trials_data(self, COND, client=None):
+        """
+        Drop-in replacement for clinical_trials_module.get_clinical_trials_data backed by the store.
+
+        Syncs the term if it was never synced or its last sync is older than
+        ``sync_interval``, then returns the stored studies. A store holding a
+        full dump import only syncs the studies updated since the dump's
+        snapshot date and answers with search_local.
+        """
+        if self._ensure_fresh(COND, client):
+            return self.search_local(COND)
+        return self.load(COND)
+
+    def get_clinical_trials_tables(self, COND, client=None):
+        """Store-backed clinical_trials_module.get_clinical_trials_tables: (DataFrame, tables, lookups)."""
+        if self._ensure_fresh(COND, client):
+            return self.search_local(COND, with_children=True)
+        return self.load(COND, with_children=True)
+
+    def _ensure_fresh(self, COND, client=None):
+        # Returns whether the store holds a full dump import
+        import_date = self.bulk_import_date()
+        previous = self.last_sync(COND)
+        if previous is None or time.time() - previous[1] > self.sync_interval:
+            self.sync(COND, client=client, since=import_date)
+        return import_date is not None
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_study_store():
+    """Return the process-wide StudyStore at the default path, creating it on first use."""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = StudyStore()
+        return _default_store
@@ -0,0 +1,57 @@
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class StubServer:
+    """A local HTTP server answering every GET with ``respond(query)``, recording the requests."""
+
+    def __init__(self):
+        self.requests = []
+        self.respond = lambda query: (200, {}, {})
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                query = {key: values[0] for key, values in parse_qs(urlsplit(self.path).query).items()}
+                stub.requests.append(query)
+                status, headers, body = stub.respond(query)
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}/api/v2/studies"
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def reply_in_order(self, responses):
+        """Answer the next requests with ``responses`` one by one, repeating the last one."""
+        responses = list(responses)
+        self.respond = lambda query: responses.pop(0) if len(responses) > 1 else responses[0]
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@pytest.fixture
+def stub_server():
+    server = StubServer()
+    yield server
+    server.close()
@@ -0,0 +1,149 @@
+
+from clinical_trials_module import (
+    CHILD_TABLES,
+    STUDY_COLUMNS,
+    build_lookups,
+    finalize_child_tables,
+    get_clinical_trials_tables,
+    normalize_children,
+    normalize_page,
+    normalize_study,
+)
+from http_client import HTTPClient
+
+
+def full_study():
+    return {
+        "protocolSection": {
+            "identificationModule": {"nctId": "NCT01234567", "briefTitle": "Drug A in asthma",
+                                     "organization": {"fullName": "Acme", "class": "INDUSTRY"}},
+            "statusModule": {"overallStatus": "RECRUITING", "startDateStruct": {"date": "2021-03"},
+                             "lastUpdatePostDateStruct": {"date": "2024-01-02", "type": "ACTUAL"}},
+            "sponsorCollaboratorsModule": {
+                "leadSponsor": {"name": "Acme", "class": "INDUSTRY"},
+                "collaborators": [{"name": "Uni X", "class": "OTHER"}, {"name": "NIH", "class": "NIH"}],
+            },
+            "conditionsModule": {"conditions": ["Asthma", "COPD"]},
+            "designModule": {
+                "phases": ["PHASE2", "PHASE3"],
+                "enrollmentInfo": {"count": 120, "type": "ESTIMATED"},
+                "designInfo": {"maskingInfo": {"masking": "DOUBLE", "whoMasked": ["PARTICIPANT", "INVESTIGATOR"]}},
+            },
+            "armsInterventionsModule": {
+                "armGroups": [{"label": "Arm 1", "interventionNames": ["Drug: A"]},
+                              {"label": "Placebo", "interventionNames": ["Drug: A"]}],
+                "interventions": [{"type": "DRUG", "name": "A", "description": "50 mg"},
+                                  {"type": "BIOLOGICAL", "name": "B"},
+                                  {"type": "DEVICE", "name": "Inhaler", "description": "daily"}],
+            },
+            "outcomesModule": {"primaryOutcomes": [{"measure": "FEV1"}], "secondaryOutcomes": [{"measure": "AE"}, {}]},
+            "eligibilityModule": {"sex": "ALL", "stdAges": ["ADULT"], "healthyVolunteers": False},
+            "contactsLocationsModule": {"locations": [{"facility": "Hosp", "city": "Paris", "country": "France"},
+                                                      {"facility": "Hosp", "city": "Paris", "country": "France"}]},
+        },
+        "hasResults": False,
+    }
+
+
+def sparse_study():
+    return {"protocolSection": {
+        "identificationModule": {"nctId": "NCT00000002"},
+        "armsInterventionsModule": {"interventions": []},
+        "contactsLocationsModule": {"locations": None},
+    }}
+
+
+def test_every_column_is_produced():
+    assert list(normalize_study(full_study())) == [name for name, _, _ in STUDY_COLUMNS]
+
+
+def test_full_study():
+    row = normalize_study(full_study())
+
+    assert row['nctId'] == 'NCT01234567'
+    assert row['organization'] == 'Acme' and row['organizationType'] == 'INDUSTRY'
+    assert row['overallStatus'] == 'RECRUITING' and row['startDate'] == '2021-03'
+    assert row['HasResults'] is False
+    assert row['collaborators'] == 'Uni X, NIH' and row['collaboratorsType'] == 'OTHER, NIH'
+    assert row['conditions'] == 'Asthma, COPD'
+    assert row['phases'] == 'PHASE2, PHASE3' and row['whoMasked'] == 'PARTICIPANT, INVESTIGATOR'
+    assert row['enrollmentCount'] == 120
+    assert row['arms'] == 'Arm 1, Placebo'
+    assert row['interventions'] == 'Drug: A'  # distinct names across arms
+    assert (row['interventionDrug'], row['interventionBiological'], row['interventioOthers']) == ('A', 'B', 'Inhaler')
+    assert row['interventionDescription'] == 'A: 50 mg\nB: \nInhaler: daily'
+    assert row['primaryOutcomes'] == 'Primary Outcome 1: FEV1'
+    assert row['secondaryOutcomes'] == 'Secondary Outcome 1: AE\nSecondary Outcome 2: None'
+    assert row['eligibilityStandardAges'] == ['ADULT'] and row['healthyVolunteers'] is False
+    assert (row['LocationName'], row['city'], row['state'], row['country']) == ('Hosp', 'Paris', '', 'France')
+    assert row['officialTitle'] is None
+
+
+def test_sparse_study_with_null_locations_and_no_interventions():
+    row = normalize_study(sparse_study())
+
+    assert row['nctId'] == 'NCT00000002'
+    assert row['briefTitle'] is None and row['enrollmentCount'] is None
+    # Missing lists become empty strings, an explicit null location list stays null
+    assert row['conditions'] == row['collaborators'] == row['phases'] == ''
+    assert row['interventionDrug'] == row['interventioOthers'] == row['interventionDescription'] == ''
+    assert (row['LocationName'], row['city'], row['state'], row['country']) == (None, None, None, None)
+
+
+def test_page_normalizer_matches_the_row_normalizer():
+    studies = [full_study(), sparse_study()]
+    rows = [normalize_study(study) for study in studies]
+
+    assert normalize_page(studies) == {column: [row[column] for row in rows] for column in rows[0]}
+
+
+def multisite_study():
+    return {"protocolSection": {
+        "identificationModule": {"nctId": "NCT00000003"},
+        "conditionsModule": {"conditions": ["asthma"]},
+        "armsInterventionsModule": {"interventions": [{"type": "DRUG", "name": "a"}]},
+        "contactsLocationsModule": {"locations": [
+            {"facility": "Charite", "city": "Berlin", "state": "Berlin", "country": " Germany "},
+            {"facility": "Site 2", "city": "Niamey", "country": "Niger"},
+            {"facility": "Hosp", "city": "Paris", "country": "France"},
+        ]},
+    }}
+
+
+def test_child_tables_have_one_row_per_value():
+    tables = finalize_child_tables(normalize_children([full_study(), sparse_study(), multisite_study()]))
+
+    assert set(tables) == set(CHILD_TABLES)
+    assert {table: len(df) for table, df in tables.items()} == {
+        'sites': 5, 'interventions': 4, 'conditions': 3, 'collaborators': 2,
+    }
+    assert list(tables['sites'].columns) == ['nctId', 'facility', 'city', 'state', 'country']
+    assert list(tables['interventions']['type']) == ['DRUG', 'BIOLOGICAL', 'DEVICE', 'DRUG']
+    assert 'NCT00000002' not in set(tables['sites']['nctId'])
+
+
+def test_lookups_map_normalized_values_to_trials():
+    lookups = build_lookups(finalize_child_tables(normalize_children([full_study(), sparse_study(), multisite_study()])))
+
+    assert lookups['country']['france'] == ['NCT00000003', 'NCT01234567']
+    assert lookups['country']['germany'] == ['NCT00000003']
+    assert lookups['country']['niger'] == ['NCT00000003'] and 'nige' not in lookups['country']
+    assert lookups['condition']['asthma'] == ['NCT00000003', 'NCT01234567']
+    assert lookups['intervention']['a'] == ['NCT00000003', 'NCT01234567']
+    assert lookups['collaborator'] == {'uni x': ['NCT01234567'], 'nih': ['NCT01234567']}
+    assert lookups['state'] == {'berlin': ['NCT00000003']}
+
+
+def test_get_clinical_trials_tables(stub_server):
+    pages = {
+        None: {"studies": [full_study(), sparse_study()], "nextPageToken": "t2"},
+        "t2": {"studies": [multisite_study()]},
+    }
+    stub_server.respond = lambda query: (200, {}, pages[query.get("pageToken")])
+
+    df, tables, lookups = get_clinical_trials_tables("asthma", client=HTTPClient(), base_url=stub_server.url)
+
+    assert list(df['nctId']) == ['NCT01234567', 'NCT00000002', 'NCT00000003']
+    assert len(tables['sites']) == 5
+    assert set(tables['sites']['nctId']) <= set(df['nctId'])
+    assert lookups['country']['germany'] == ['NCT00000003']
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from code_cache import CodeCache, content_tokens
+
+VOCABULARY = ['how', 'many', 'trials', 'recruiting', 'phase', 'count', 'number', 'of', 'are', 'in']
+
+
+def embed(text):
+    """A toy embedding that, like a real one, barely tells entity names and numbers apart."""
+    words = text.lower().replace('?', '').split()
+    return np.array([words.count(word) for word in VOCABULARY] + [1.0])
+
+
+@pytest.fixture
+def cache():
+    cache = CodeCache(embed=embed)
+    cache.store("How many trials are recruiting in Germany?", ['clinical_trials_df'], 'f', "germany_code")
+    cache.store("How many phase 2 trials are recruiting?", ['clinical_trials_df'], 'f', "phase_code")
+    return cache
+
+
+def lookup(cache, question):
+    entry = cache.lookup(question, lambda dfs: 'f')
+    return entry.code if entry is not None else None
+
+
+def test_near_duplicate_question_hits(cache):
+    assert lookup(cache, "how many trials are recruiting in Germany") == "germany_code"
+    assert cache.exact_hits == 1
+    assert lookup(cache, "How many recruiting trials in Germany?") == "germany_code"
+    assert cache.semantic_hits == 1
+
+
+@pytest.mark.parametrize("question", [
+    "How many trials are recruiting in France?",
+    "how many trials are recruiting in france",
+    "How many phase 3 trials are recruiting?",
+    "How many trials are recruiting?",
+])
+def test_questions_with_other_content_miss(cache, question):
+    assert lookup(cache, question) is None
+    assert cache.misses == 1
+
+
+def test_lower_case_entity_swap_misses():
+    cache = CodeCache(embed=embed)
+    cache.store('how many trials are recruiting in germany', ['clinical_trials_df'], 'f', "germany_code")
+    assert lookup(cache, 'how many trials are recruiting in france') is None
+    assert lookup(cache, 'how many recruiting trials in germany') == "germany_code"
+
+
+def test_content_tokens():
+    assert content_tokens("Which Phase II trials by Novartis started after 2020?") == \
+        {'phase', 'ii', 'trial', 'by', 'novartis', 'started', 'after', '2020'}
+    assert content_tokens("How many trials are recruiting in Germany?") == \
+        content_tokens("the number of recruiting studies in germany")
+    assert content_tokens("List trials not recruiting") != content_tokens("List trials recruiting")
@@ -0,0 +1,88 @@
+import pandas as pd
+import pytest
+
+from clinical_trials_module import copy_lookups
+from data_cache import DataCache
+from sandbox import code_namespace, run_code
+
+
+@pytest.fixture(autouse=True)
+def copy_on_write():
+    # Enabled at startup by the app and the sandbox workers
+    with pd.option_context("mode.copy_on_write", True):
+        yield
+
+
+def trials():
+    return pd.DataFrame({
+        'nctId': pd.Series(['NCT1', 'NCT2', 'NCT3'], dtype='string[pyarrow]'),
+        'enrollmentCount': [10, 20, 30],
+        'overallStatus': pd.Categorical(['RECRUITING', 'COMPLETED', 'RECRUITING']),
+    })
+
+
+def set_cell(df):
+    df.loc[0, 'enrollmentCount'] = 999
+
+
+def set_string_cell(df):
+    df.iloc[1, 0] = 'NCT9'
+
+
+def fill_in_place(df):
+    df.fillna({'enrollmentCount': 0}, inplace=True)
+    df['enrollmentCount'] *= 2
+
+
+def update(df):
+    df.update(pd.DataFrame({'enrollmentCount': [5]}, index=[2]))
+
+
+@pytest.fixture
+def cache():
+    cache = DataCache()
+    cache.loads = 0
+
+    def load():
+        cache.loads += 1
+        return trials()
+
+    cache.load = lambda: cache.get_or_load(('ct', 'x'), load)
+    return cache
+
+
+@pytest.mark.parametrize("modify", [set_cell, set_string_cell, fill_in_place, update])
+def test_session_copy_leaves_the_cached_frame_unchanged(cache, modify):
+    session = cache.load().copy(deep=False)
+
+    modify(session)
+
+    pd.testing.assert_frame_equal(cache.load(), trials())
+    assert cache.loads == 1
+
+
+def test_generated_code_cannot_modify_the_cached_frame(cache):
+    session = cache.load().copy(deep=False)
+    code = ("clinical_trials_df.loc[clinical_trials_df['overallStatus'] == 'RECRUITING', 'enrollmentCount'] = 0\n"
+            "clinical_trials_df.sort_values('nctId', ascending=False, inplace=True)\n"
+            "top = clinical_trials_df.head(1)\n"
+            "result_df = top")
+
+    result = run_code(code, code_namespace(code, ['clinical_trials_df'], df_ct=session))
+
+    assert result['error'] is None
+    assert session['enrollmentCount'].sum() == 20
+    pd.testing.assert_frame_equal(cache.load(), trials())
+
+
+def test_copied_lookups_leave_the_cached_lookups_unchanged():
+    cached = {'country': {'germany': ['NCT1'], 'france': ['NCT2']}}
+    code = "ct_lookup['country']['germany'].append('NCT9')\nct_lookup['country'].pop('france')"
+
+    session = copy_lookups(cached)
+    exec(code, {'ct_lookup': session})
+    run_code(code, code_namespace(code, ['clinical_trials_df'], ct_lookup=cached, copy=True))
+
+    assert cached == {'country': {'germany': ['NCT1'], 'france': ['NCT2']}}
+    assert session == {'country': {'germany': ['NCT1', 'NCT9']}}
+
@@ -0,0 +1,75 @@
+import pytest
+import requests
+
+import http_client
+from clinical_trials_module import PaginationError, iter_clinical_trials_pages
+from http_client import HTTPClient
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Record backoff delays instead of sleeping."""
+    delays = []
+    monkeypatch.setattr(http_client.time, "sleep", delays.append)
+    return delays
+
+
+def test_429_waits_for_retry_after(stub_server, sleeps):
+    stub_server.reply_in_order([(429, {"Retry-After": "7"}, {}), (200, {}, {"ok": True})])
+
+    assert HTTPClient().get_json(stub_server.url) == {"ok": True}
+    assert len(stub_server.requests) == 2
+    assert sleeps == [7.0]
+
+
+def test_5xx_is_retried_until_it_succeeds(stub_server, sleeps):
+    stub_server.reply_in_order([(503, {}, {}), (502, {}, {}), (200, {}, {"ok": True})])
+
+    assert HTTPClient(backoff_base=0.1).get_json(stub_server.url) == {"ok": True}
+    assert len(stub_server.requests) == 3
+    assert len(sleeps) == 2 and all(0 <= delay <= 0.2 for delay in sleeps)
+
+
+def test_non_retryable_status_raises_immediately(stub_server, sleeps):
+    stub_server.reply_in_order([(404, {}, {})])
+
+    with pytest.raises(requests.exceptions.HTTPError):
+        HTTPClient().get_json(stub_server.url)
+    assert len(stub_server.requests) == 1
+    assert sleeps == []
+
+
+@pytest.mark.parametrize("prefetch", [True, False])
+def test_pages_are_chained_by_page_token(stub_server, sleeps, prefetch):
+    pages = {
+        None: {"studies": [{"id": 1}, {"id": 2}], "nextPageToken": "t2"},
+        "t2": {"studies": [{"id": 3}], "nextPageToken": "t3"},
+        "t3": {"studies": [{"id": 4}]},
+    }
+    stub_server.respond = lambda query: (200, {}, pages[query.get("pageToken")])
+
+    studies = list(iter_clinical_trials_pages("asthma", prefetch=prefetch, client=HTTPClient(),
+                                              base_url=stub_server.url))
+
+    assert studies == [[{"id": 1}, {"id": 2}], [{"id": 3}], [{"id": 4}]]
+    assert [query.get("pageToken") for query in stub_server.requests] == [None, "t2", "t3"]
+    assert all(query["query.term"] == "asthma" for query in stub_server.requests)
+
+
+def test_pagination_error_when_retries_run_out(stub_server, sleeps):
+    def respond(query):
+        if query.get("pageToken") is None:
+            return 200, {}, {"studies": [{"id": 1}], "nextPageToken": "t2"}
+        return 500, {}, {}
+    stub_server.respond = respond
+
+    pages = iter_clinical_trials_pages("asthma", client=HTTPClient(max_retries=2), base_url=stub_server.url)
+    assert next(pages) == [{"id": 1}]
+    with pytest.raises(PaginationError) as raised:
+        next(pages)
+
+    # The failing page can be resumed from its token
+    assert raised.value.page_token == "t2"
+    assert raised.value.pages_fetched == 1
+    assert [query.get("pageToken") for query in stub_server.requests] == [None, "t2", "t2", "t2"]
+    assert len(sleeps) == 2
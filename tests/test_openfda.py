@@ -0,0 +1,91 @@
+import pytest
+
+from openfda import Open_FDA
+
+
+class Synonyms:
+    def __init__(self, names):
+        self.names = names
+
+    def matching_names(self, keyword):
+        return self.names
+
+
+def labels(*names):
+    return {
+        'brand_name': list(names),
+        'generic_name': [name.lower() for name in names],
+        'manufacturer_name': ['Maker'] * len(names),
+        'application_number': ['NDA1'] * len(names),
+        'indications_and_usage': ['hypertension'] * len(names),
+    }
+
+
+@pytest.fixture
+def api(monkeypatch):
+    calls = []
+
+    def open_fda_data(user_keyword, keyword_domain, search=None):
+        calls.append(('keyword', user_keyword))
+        return labels('Lisinopril', 'Other')
+
+    def open_fda_names_data(names):
+        calls.append(('names', names))
+        return labels('Lisinopril')
+
+    monkeypatch.setattr(Open_FDA, 'open_fda_data', staticmethod(open_fda_data))
+    monkeypatch.setattr(Open_FDA, 'open_fda_names_data', staticmethod(open_fda_names_data))
+    return calls
+
+
+def test_few_names_are_requested_exactly(api):
+    names = {'brand_name': ['Lisinopril']}
+
+    df = Open_FDA.open_fda_main(domain='drug', user_keyword='lisinopril', synonyms=Synonyms(names))
+
+    assert api == [('names', names)]
+    assert list(df['brand_name']) == ['Lisinopril']
+
+
+def test_too_many_names_fall_back_to_the_keyword_search(api, monkeypatch):
+    monkeypatch.setattr(Open_FDA, 'max_expanded_names', 3)
+    names = {'brand_name': ['Lisinopril', 'Prinivil'], 'generic_name': ['lisinopril', 'lisinopril and hctz']}
+
+    df = Open_FDA.open_fda_main(domain='drug', user_keyword='lisinopril', synonyms=Synonyms(names))
+
+    assert api == [('keyword', 'lisinopril')]
+    assert list(df['brand_name']) == ['Lisinopril']  # filtered by the keyword afterwards
+
+
+def test_projected_columns_keep_the_order_of_the_records():
+    records = [
+        {'indications_and_usage': ['hypertension'], 'openfda': {'brand_name': ['B', 'B'], 'route': ['ORAL']},
+         'warnings': ['none'], 'id': 'x'},
+        {'adverse_reactions': ['nausea'], 'indications_and_usage': ['asthma']},
+    ]
+
+    data = Open_FDA.project_records(records)
+
+    assert list(data)[:5] == ['indications_and_usage', 'brand_name', 'route', 'warnings', 'adverse_reactions']
+    assert data['brand_name'] == ['B', None] and data['adverse_reactions'] == [None, 'nausea']
+    assert set(data) == Open_FDA.needed_column_names
+
+
+def test_local_store_gets_the_same_cap(monkeypatch):
+    class Store:
+        searches = []
+
+        def import_date(self):
+            return '2024-01-01'
+
+        def search(self, user_keyword, keyword_domain, names=None):
+            self.searches.append(names)
+            return labels('Lisinopril')
+
+    monkeypatch.setattr(Open_FDA, 'max_expanded_names', 3)
+    few, many = {'brand_name': ['Lisinopril']}, {'brand_name': ['A in', 'B in', 'C in', 'D in']}
+
+    Open_FDA.open_fda_main(domain='drug', user_keyword='lisinopril', store=Store(), synonyms=Synonyms(few))
+    Open_FDA.open_fda_main(domain='drug', user_keyword='in', store=Store(), synonyms=Synonyms(many))
+
+    assert Store.searches == [few, None]
@@ -0,0 +1,66 @@
+import pandas as pd
+import pytest
+
+from result_compaction import compact_result, estimate_tokens
+
+
+@pytest.fixture
+def large_df():
+    return pd.DataFrame({
+        'nctId': [f"NCT{i:08d}" for i in range(5000)],
+        'enrollmentCount': range(5000),
+        'overallStatus': ['RECRUITING', 'COMPLETED'] * 2500,
+    })
+
+
+@pytest.fixture
+def long_output():
+    # str() of a frame is only ever a few rows, so it is long printed output that overflows the budget
+    return "\n".join(f"line {i}" for i in range(5000))
+
+
+def test_result_under_budget_is_unchanged():
+    df = pd.DataFrame({'country': ['Germany', 'France'], 'trials': [12, 7]})
+
+    assert compact_result("2 countries", df, budget=1000) == ("2 countries", str(df), False)
+
+
+def test_result_over_budget_is_compacted(large_df, long_output):
+    output, data, compacted = compact_result(long_output, large_df, budget=600)
+
+    assert compacted
+    assert estimate_tokens(output) + estimate_tokens(data) <= 600
+    assert data.startswith("5000 rows x 3 columns")
+    assert "- enrollmentCount (int64): 5000 non-null, min 0" in data
+    assert "'RECRUITING': 2500" in data
+    # Evenly spaced rows run from the first to the last
+    assert "NCT00000000" in data and "NCT00004999" in data
+
+
+def test_duplicate_column_names_are_described(large_df, long_output):
+    df = pd.concat([large_df, large_df[['enrollmentCount']]], axis=1)
+
+    output, data, compacted = compact_result(long_output, df, budget=600)
+
+    assert compacted
+    assert data.count("- enrollmentCount (int64)") == 2
+
+
+def test_multiindex_columns_are_described(large_df, long_output):
+    df = large_df.copy()
+    df.columns = pd.MultiIndex.from_tuples([('trial', 'nctId'), ('trial', 'enrollment'), ('status', 'overall')])
+
+    output, data, compacted = compact_result(long_output, df, budget=600)
+
+    assert compacted
+    assert "- ('trial', 'enrollment') (int64): 5000 non-null" in data
+
+
+def test_long_output_keeps_its_first_and_last_lines(long_output):
+    text, data, compacted = compact_result(long_output, None, budget=500)
+
+    assert compacted and data == "None"
+    assert estimate_tokens(text) <= 500
+    lines = text.splitlines()
+    assert lines[0] == "line 0" and lines[-1] == "line 4999"
+    assert any("lines omitted" in line for line in lines)
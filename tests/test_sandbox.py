@@ -0,0 +1,39 @@
+import pandas as pd
+import pytest
+
+from sandbox import SandboxPool
+from workflow import SessionData
+
+
+@pytest.fixture(scope="module")
+def pool():
+    pool = SandboxPool(workers=1, timeout=30, memory_limit=None)
+    yield pool
+    pool.close()
+
+
+def session_from(cached):
+    df_ct, ct_tables, ct_lookup = cached
+    return SessionData(
+        df_ct=df_ct.copy(deep=False),
+        ct_tables={name: table.copy(deep=False) for name, table in ct_tables.items()},
+        ct_lookup=ct_lookup,
+        data_source={'ct': cached},
+    )
+
+
+def test_sessions_of_one_cache_entry_share_an_export(pool):
+    cached = (pd.DataFrame({'nctId': ['NCT1', 'NCT2'], 'enrollmentCount': [10, 20]}), {}, {})
+    first, second = session_from(cached), session_from(cached)
+    code = ("total = clinical_trials_df['enrollmentCount'].sum()\n"
+            "total_df = pd.DataFrame({'total': [total]})")
+
+    results = [pool.run(code, ['clinical_trials_df'], session) for session in (first, second)]
+
+    assert [result['error'] for result in results] == [None, None]
+    assert list(results[1]['result_df']['total']) == [30]
+    assert pool.stats()['exports'] == 1
+
+    other = session_from((pd.DataFrame({'nctId': ['NCT3'], 'enrollmentCount': [5]}), {}, {}))
+    assert list(pool.run(code, ['clinical_trials_df'], other)['result_df']['total']) == [5]
+    assert pool.stats()['exports'] == 2
@@ -0,0 +1,25 @@
+import pytest
+
+from schema_context import CONTEXT_INDEXES, data_context_for
+
+CT_COLUMNS = list(CONTEXT_INDEXES['clinical_trials_df'].entries)
+
+
+@pytest.mark.parametrize("question", [
+    "How many trials are in France?",
+    "Which sponsors run trials with interventions other than drugs?",
+    "What is the average enrollment?",
+])
+def test_companion_tables_are_always_described(question):
+    context = data_context_for(question, {'clinical_trials_df': CT_COLUMNS})
+
+    assert "-ct_sites_df:" in context
+    assert "-ct_lookup:" in context
+
+
+def test_unrelated_columns_are_listed_by_name_only():
+    context = data_context_for("How many trials are in France?", {'clinical_trials_df': CT_COLUMNS})
+    described = [line.split(':')[0][1:] for line in context.splitlines() if line.startswith('-')]
+
+    assert 'nctId' in described and 'enrollmentCount' not in described
+    assert 'enrollmentCount' in context.split("Other columns: ")[1]
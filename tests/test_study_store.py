@@ -0,0 +1,88 @@
+import json
+import sqlite3
+import zipfile
+
+import pytest
+
+import bulk_loader
+import study_store
+from study_store import StudyStore
+
+
+def raw_study(nct_id, title, country="United States", summary=""):
+    return {"protocolSection": {
+        "identificationModule": {"nctId": nct_id, "briefTitle": title},
+        "statusModule": {"lastUpdatePostDateStruct": {"date": "2024-05-01"}},
+        "descriptionModule": {"briefSummary": summary},
+        "contactsLocationsModule": {"locations": [{"facility": "General Hospital", "city": "Lyon", "country": country}]},
+    }}
+
+
+@pytest.fixture
+def api(monkeypatch):
+    """Replace the CT.gov page iterator with one serving ``api.studies``, recording each advanced filter."""
+    class Api:
+        studies = []
+        filters = []
+
+    def pages(COND, client=None, advanced_filter=None):
+        Api.filters.append(advanced_filter)
+        yield list(Api.studies)
+
+    monkeypatch.setattr(study_store, "iter_clinical_trials_pages", pages)
+    return Api
+
+
+@pytest.fixture
+def store(tmp_path):
+    return StudyStore(str(tmp_path / "studies.sqlite"))
+
+
+def test_bulk_import_keeps_syncing_from_the_import_date(store, api):
+    store.upsert([study_store.normalize_study(raw_study("NCT00000001", "Asthma inhaler trial"))])
+    store.mark_bulk_import("2024-03-01")
+    api.studies = [raw_study("NCT00000002", "New asthma biologic trial")]
+
+    df = store.get_clinical_trials_data("asthma")
+
+    assert api.filters == ["AREA[LastUpdatePostDate]RANGE[2024-03-01,MAX]"]
+    assert sorted(df["nctId"]) == ["NCT00000001", "NCT00000002"]
+
+    store.get_clinical_trials_data("asthma")
+    assert len(api.filters) == 1  # within sync_interval
+
+    store.sync_interval = -1
+    store.get_clinical_trials_data("asthma")
+    assert api.filters[1].startswith("AREA[LastUpdatePostDate]RANGE[") and api.filters[1] != api.filters[0]
+
+
+def test_search_local_matches_locations_and_summaries(store):
+    store.upsert([
+        study_store.normalize_study(raw_study("NCT00000001", "Asthma trial", country="France")),
+        study_store.normalize_study(raw_study("NCT00000002", "Eczema trial", summary="A pediatric asthma cohort")),
+    ])
+
+    assert list(store.search_local("France")["nctId"]) == ["NCT00000001"]
+    assert sorted(store.search_local("asthma")["nctId"]) == ["NCT00000001", "NCT00000002"]
+
+
+def test_index_of_older_stores_is_rebuilt(tmp_path):
+    path = str(tmp_path / "studies.sqlite")
+    StudyStore(path).upsert([study_store.normalize_study(raw_study("NCT00000001", "Asthma trial", country="France"))])
+    with sqlite3.connect(path) as conn:
+        conn.execute("DROP TABLE studies_fts")
+        conn.execute("CREATE VIRTUAL TABLE studies_fts USING fts5 (title, conditions, interventions, sponsors, summary)")
+
+    assert list(StudyStore(path).search_local("France")["nctId"]) == ["NCT00000001"]
+
+
+def test_bulk_import_records_the_snapshot_date(store, tmp_path):
+    zip_path = tmp_path / "dump.zip"
+    with zipfile.ZipFile(zip_path, "w") as archive:
+        for nct_id, updated in [("NCT00000001", "2024-02-10"), ("NCT00000002", "2024-02-27")]:
+            study = raw_study(nct_id, "Asthma trial")
+            study["protocolSection"]["statusModule"]["lastUpdatePostDateStruct"]["date"] = updated
+            archive.writestr(f"{nct_id}.json", json.dumps(study))
+
+    assert bulk_loader.bulk_import(str(zip_path), store, workers=1) == 2
+    assert store.bulk_import_date() == "2024-02-27"
@@ -0,0 +1,35 @@
+import pandas as pd
+
+from lazy_columns import split_lazy_columns
+from text_index import TextIndex
+
+
+def fda_frame():
+    return pd.DataFrame({
+        'brand_name': ['A', 'B', 'C'],
+        'indications_and_usage': ['hypertension', 'asthma', 'type 2 diabetes'],
+        'adverse_reactions': ['nausea and headache', 'renal impairment', 'severe nausea'],
+        'warnings': ['none', 'lactic acidosis', 'none'],
+    })
+
+
+def test_parked_columns_are_loaded_on_first_search(tmp_path):
+    df, lazy = split_lazy_columns(fda_frame(), ['adverse_reactions', 'warnings'], directory=str(tmp_path))
+    index = TextIndex()
+    index.register('FDA_drugs_df', df, lazy=lazy)
+    assert 'adverse_reactions' not in df.columns
+
+    result = index.search('FDA_drugs_df', 'adverse_reactions', 'nausea')
+
+    assert list(result['brand_name']) == ['A', 'C']
+    assert 'adverse_reactions' in df.columns and 'warnings' not in df.columns
+    assert list(index.search('FDA_drugs_df', 'warnings', '"lactic acidosis"')['brand_name']) == ['B']
+
+
+def test_boolean_query():
+    index = TextIndex()
+    index.register('FDA_drugs_df', fda_frame())
+
+    result = index.search('FDA_drugs_df', 'adverse_reactions', 'nausea AND NOT severe')
+
+    assert list(result['brand_name']) == ['A']
@@ -0,0 +1,201 @@
+import re
+from bisect import bisect_left
+
+import numpy as np
+
+# Narrative columns indexed as soon as a DataFrame is registered; any other
+# text column, and any of these still parked in a LazyColumns store, is
+# indexed on its first search.
+TEXT_COLUMNS = {
+    'clinical_trials_df': ['briefSummary', 'detailedDescription', 'eligibilityCriteria', 'interventionDescription'],
+    'FDA_drugs_df': ['indications_and_usage', 'adverse_reactions', 'warnings'],
+}
+
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:['\-][a-z0-9]+)*")
+QUERY_RE = re.compile(r'"([^"]*)"|(\()|(\))|([^\s()"]+)')
+
+_EMPTY = np.array([], dtype=np.int32)
+
+
+def tokenize(text):
+    """Lower-case word tokens of a text; hyphenated and apostrophe words stay whole."""
+    return TOKEN_RE.findall(text.lower())
+
+
+class InvertedIndex:
+    """A token -> row positions index over one text column.
+
+    Postings are sorted int32 arrays of row positions, so boolean queries are
+    set operations on small arrays instead of a regex scan over every cell.
+    Phrases are answered by intersecting the postings of their words and
+    checking the phrase only in the remaining candidate rows.
+    """
+
+    def __init__(self, values):
+        """
+        Args:
+            values (iterable): The column's cells in row order; non-strings are treated as empty.
+        """
+        self.texts = list(values)
+        postings = {}
+        for position, text in enumerate(self.texts):
+            if isinstance(text, str):
+                for token in set(tokenize(text)):
+                    postings.setdefault(token, []).append(position)
+        self.postings = {token: np.asarray(rows, dtype=np.int32) for token, rows in postings.items()}
+        self.vocabulary = sorted(self.postings)
+        self.all_rows = np.arange(len(self.texts), dtype=np.int32)
+
+    def term(self, word):
+        """Rows containing ``word`` as a whole token, or any token starting with it if it ends in '*'."""
+        if word.endswith('*'):
+            prefix = word[:-1].lower()
+            start = bisect_left(self.vocabulary, prefix)
+            matches = []
+            for token in self.vocabulary[start:]:
+                if not token.startswith(prefix):
+                    break
+                matches.append(self.postings[token])
+            return np.unique(np.concatenate(matches)) if matches else _EMPTY
+        tokens = tokenize(word)
+        if len(tokens) > 1:
+            # Punctuated input such as 'covid-19/sars' behaves like a phrase
+            return self.phrase(word)
+        return self.postings.get(tokens[0], _EMPTY) if tokens else _EMPTY
+
+    def phrase(self, phrase):
+        """Rows containing the words of ``phrase`` consecutively (ignoring case and punctuation)."""
+        tokens = tokenize(phrase)
+        if not tokens:
+            return _EMPTY
+        candidates = self.postings.get(tokens[0], _EMPTY)
+        for token in tokens[1:]:
+            candidates = np.intersect1d(candidates, self.postings.get(token, _EMPTY), assume_unique=True)
+        if len(tokens) == 1:
+            return candidates
+        pattern = re.compile(r'\b' + r'\W+'.join(re.escape(token) for token in tokens) + r'\b', re.IGNORECASE)
+        return np.asarray([row for row in candidates if pattern.search(self.texts[row])], dtype=np.int32)
+
+    def search(self, query):
+        """
+        Evaluate a boolean query and return the sorted matching row positions.
+
+        Words are matched as whole tokens, case-insensitively. Supported syntax:
+        ``"exact phrase"``, ``AND`` (also implied between terms), ``OR``, ``NOT``,
+        parentheses and a trailing ``*`` for prefix matches, e.g.
+        ``(nausea OR vomiting) AND NOT "renal impairment"``.
+        """
+        tokens = []
+        for phrase, left, right, word in QUERY_RE.findall(query):
+            if left or right:
+                tokens.append(left or right)
+            elif word in ('AND', 'OR', 'NOT'):
+                tokens.append(word)
+            else:
+                tokens.append(('phrase', phrase) if not word else ('term', word))
+        result, rest = self._parse_or(tokens)
+        if rest:
+            raise ValueError(f"Unexpected {rest[0]!r} in search query: {query!r}")
+        return result
+
+    # Recursive descent: or := and (OR and)*; and := not ([AND] not)*; not := NOT not | atom
+    def _parse_or(self, tokens):
+        result, tokens = self._parse_and(tokens)
+        while tokens and tokens[0] == 'OR':
+            right, tokens = self._parse_and(tokens[1:])
+            result = np.union1d(result, right)
+        return result, tokens
+
+    def _parse_and(self, tokens):
+        result, tokens = self._parse_not(tokens)
+        while tokens and tokens[0] not in ('OR', ')'):
+            if tokens[0] == 'AND':
+                tokens = tokens[1:]
+            right, tokens = self._parse_not(tokens)
+            result = np.intersect1d(result, right, assume_unique=True)
+        return result, tokens
+
+    def _parse_not(self, tokens):
+        if tokens and tokens[0] == 'NOT':
+            operand, tokens = self._parse_not(tokens[1:])
+            return np.setdiff1d(self.all_rows, operand, assume_unique=True), tokens
+        return self._parse_atom(tokens)
+
+    def _parse_atom(self, tokens):
+        if not tokens:
+            raise ValueError("Incomplete search query")
+        token, tokens = tokens[0], tokens[1:]
+        if token == '(':
+            result, tokens = self._parse_or(tokens)
+            if not tokens or tokens[0] != ')':
+                raise ValueError("Unbalanced parentheses in search query")
+            return result, tokens[1:]
+        if isinstance(token, tuple):
+            kind, text = token
+            return (self.phrase(text) if kind == 'phrase' else self.term(text)), tokens
+        raise ValueError(f"Unexpected {token!r} in search query")
+
+
+class TextIndex:
+    """Inverted indexes for the DataFrames of one session, exposed to generated code as ``search``.
+
+    Registering a DataFrame under a name drops every index built for the
+    previous DataFrame of that name, so refreshed data is never searched
+    through stale postings. Columns parked in the DataFrame's LazyColumns
+    store are loaded into it when they are first searched.
+    """
+
+    def __init__(self):
+        self.frames = {}
+        self.lazy = {}
+        self.indexes = {}
+
+    def register(self, df_name, df, columns=None, lazy=None):
+        """
+        Register (or replace) a DataFrame and index its narrative columns.
+
+        Args:
+            df_name (str): The name generated code uses for the DataFrame, e.g. 'clinical_trials_df'.
+            df (pd.DataFrame): The DataFrame, or None to forget the name.
+            columns (list, optional): Columns to index now. Defaults to TEXT_COLUMNS[df_name].
+            lazy (lazy_columns.LazyColumns, optional): The store of columns parked off ``df``.
+        """
+        self.indexes = {key: index for key, index in self.indexes.items() if key[0] != df_name}
+        self.lazy.pop(df_name, None)
+        if df is None:
+            self.frames.pop(df_name, None)
+            return
+        self.frames[df_name] = df
+        if lazy is not None:
+            self.lazy[df_name] = lazy
+        for column in columns if columns is not None else TEXT_COLUMNS.get(df_name, []):
+            if column in df.columns:
+                self._index(df_name, column)
+
+    def _index(self, df_name, column):
+        key = (df_name, column)
+        if key not in self.indexes:
+            self.indexes[key] = InvertedIndex(self.frames[df_name][column].tolist())
+        return self.indexes[key]
+
+    def search(self, df_name, column, query):
+        """
+        Return the rows of a registered DataFrame whose ``column`` matches ``query``.
+
+        Args:
+            df_name (str): The DataFrame name, e.g. 'FDA_drugs_df'.
+            column (str): The text column to search.
+            query (str): A boolean/phrase query, see InvertedIndex.search.
+
+        Returns:
+            pd.DataFrame: The matching rows, in their original order.
+        """
+        if df_name not in self.frames:
+            raise KeyError(f"No DataFrame registered as {df_name!r}; available: {list(self.frames)}")
+        df = self.frames[df_name]
+        lazy = self.lazy.get(df_name)
+        if lazy is not None and column in lazy.pending(df):
+            lazy.materialize(df, [column])
+        if column not in df.columns:
+            raise KeyError(f"{df_name} has no column {column!r}")
+        return df.iloc[self._index(df_name, column).search(query)]
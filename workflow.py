@@ -0,0 +1,418 @@
+import hashlib
+import re
+import threading
+from typing import Annotated, Literal, TypedDict
+
+import pandas as pd
+from langchain_core.messages import AnyMessage, HumanMessage
+from langchain_core.runnables import RunnableConfig
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+from langgraph.graph import END, START, StateGraph
+from langgraph.graph.message import add_messages
+from langgraph.types import Command
+
+from code_cache import CodeCache, normalize_question, schema_fingerprint
+from context import drug_lookup_context, text_search_context
+from lazy_columns import column_names
+from result_compaction import compact_result
+from schema_context import data_context_for
+from sandbox import code_namespace, run_code
+
+
+class MessageState(TypedDict):
+    messages:Annotated[list[AnyMessage], add_messages]
+    code: str
+    result: str
+    retry_count: int
+    next: str
+    dfs: list[str]
+    out_df: any
+    summary: str
+    last_df_name: str
+    cache_entry: any
+    cache_hit: bool
+
+
+class df_selection(TypedDict):
+    """Dataframe selection: Choose one or more dataframes to query from."""
+    df: list[Literal["clinical_trials_df", "FDA_drugs_df"]]  # Now df is a LIST
+
+
+class SessionData:
+    """The data of one Streamlit session, handed to the shared graph for a single run.
+
+    Passed as ``config["configurable"]["session"]`` so the compiled graph
+    itself holds no per-session state.
+    """
+
+    def __init__(self, df_ct=None, df_fda=None, ct_tables=None, ct_lookup=None, fda_lazy=None,
+                 text_index=None, drug_synonyms=None, code_cache=None, sandbox=None, data_source=None,
+                 notify=print):
+        """
+        Args:
+            df_ct (pd.DataFrame, optional): The clinical trials DataFrame.
+            df_fda (pd.DataFrame, optional): The Open FDA DataFrame.
+            ct_tables (dict, optional): Companion clinical trials tables by name.
+            ct_lookup (dict, optional): Exact-match clinical trials lookups.
+            fda_lazy (lazy_columns.LazyColumns, optional): The parked heavy FDA columns.
+            text_index (text_index.TextIndex, optional): The session's full-text index.
+            drug_synonyms (drug_synonyms.DrugSynonyms, optional): The drug name index.
+            code_cache (code_cache.CodeCache, optional): Reuses code generated for earlier questions.
+            sandbox (sandbox.SandboxPool, optional): Runs the generated code in worker processes.
+                Defaults to running it in this process.
+            data_source (dict, optional): The shared values the data above was copied from, e.g. the
+                DataCache results by source. Sessions with the same values share one sandbox export.
+            notify (callable, optional): Shows progress messages to the user. Defaults to print.
+        """
+        self.df_ct = df_ct
+        self.df_fda = df_fda
+        self.ct_tables = ct_tables or {}
+        self.ct_lookup = ct_lookup or {}
+        self.fda_lazy = fda_lazy
+        self.text_index = text_index
+        self.drug_synonyms = drug_synonyms
+        self.code_cache = code_cache
+        self.sandbox = sandbox
+        self.data_source = data_source
+        self.notify = notify
+
+
+def _session(config):
+    return config["configurable"]["session"]
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_llm(**kwargs):
+    """Return a process-wide ChatOpenAI client for the given settings, creating it on first use."""
+    key = tuple(sorted(kwargs.items()))
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = ChatOpenAI(**kwargs)
+        return _clients[key]
+
+
+def get_embeddings():
+    """Return the process-wide embeddings client used to match similar questions."""
+    with _clients_lock:
+        if "embeddings" not in _clients:
+            _clients["embeddings"] = OpenAIEmbeddings(model="text-embedding-3-small")
+        return _clients["embeddings"]
+
+
+_code_cache = None
+
+
+def get_code_cache():
+    """Return the process-wide CodeCache, matching similar questions through get_embeddings()."""
+    global _code_cache
+    with _clients_lock:
+        if _code_cache is None:
+            _code_cache = CodeCache(embed=lambda text: get_embeddings().embed_query(text))
+        return _code_cache
+
+
+def _fingerprint(session, dfs):
+    frames = {"clinical_trials_df": (session.df_ct, None), "FDA_drugs_df": (session.df_fda, session.fda_lazy)}
+    columns = {}
+    for name in dfs:
+        df, lazy = frames.get(name, (None, None))
+        # Parked columns count too, so the fingerprint does not change as they are materialized
+        columns[name] = column_names(df, lazy) if isinstance(df, pd.DataFrame) else []
+    return schema_fingerprint(columns)
+
+
+def check_code_cache(state: MessageState, config: RunnableConfig) -> Command[Literal["select_dataframe", "agent"]]:
+    """Reuse the code of an earlier, same or similar question over the same columns and go straight to execution."""
+    session = _session(config)
+    if session.code_cache is not None:
+        entry = session.code_cache.lookup(
+            state['messages'][-1].content, lambda dfs: _fingerprint(session, dfs)
+        )
+        if entry is not None:
+            return Command(
+                goto="agent",
+                update={"code": entry.code, "dfs": entry.dfs, "cache_entry": entry, "cache_hit": True},
+            )
+    return Command(goto="select_dataframe")
+
+
+def select_dataframe(state: MessageState, config: RunnableConfig) -> Command[Literal["generate_code"]]:
+    """Dataframe selection node: Choose the dataframe(s) to query from."""
+
+    dataframes = ["clinical_trials_df", "FDA_drugs_df"]
+
+    df_selection_prompt = f"""Your task is to select relevant dataframes from {dataframes} based on the user query:
+                            {state['messages'][-1]}.
+                            - Choose either one or both dataframes as needed.
+                            - If the query requires information from both, return both in a list.
+    """
+
+    messages = [
+        {"role": "system", "content": df_selection_prompt},
+    ] + state["messages"]
+
+    response = get_llm(model="gpt-4o").with_structured_output(df_selection).invoke(messages)
+
+    dfs = response["df"]
+
+    # Ensure dfs is always a list (even if the model returns a single string)
+    if isinstance(dfs, str):
+        dfs = [dfs]
+
+    return Command(goto="generate_code", update={"dfs": dfs})
+
+
+def clean_code_response(response):
+    response = re.sub(r'<think>.*?</think>', '', response, flags=re.DOTALL)
+    code_match = re.search(r'```python\n(.*?)```', response, flags=re.DOTALL)
+    return code_match.group(1).strip() if code_match else response.strip()
+
+
+# Define the workflow functions
+def generate_code(state: MessageState, config: RunnableConfig) -> Command[Literal["agent"]]:
+    session = _session(config)
+    system_prompt = """Youa are a smart and intellegent heathcare Analyst. Your job is to Generate Python code that:
+    - Uses only provided variables
+    - Give the final dataframe from which answer to the query can be answered, and all the datafrmes in the code should have a suffix '_df
+    - Includes any necessary imports
+    - If fixing an error, correct the previous code while maintaining logic
+    - While matching any name lower the case for the term to search and in data where to search
+    - Also, try to use contains rather than exact match like ==
+    - Change values with df.loc[rows, 'column'] = value, never chained like df['column'][rows] = value
+    """
+
+    # Helper descriptions are the same for every question, so they go first with the system prompt;
+    # providers can then reuse the cached prompt prefix across questions and retries
+    static_prompt = f"""{system_prompt}
+    {text_search_context}
+    {drug_lookup_context if session.drug_synonyms is not None else ''}"""
+
+    # Mapping of dataframe names to actual dataframes
+    df_mapping = {
+        "clinical_trials_df": session.df_ct,
+        "FDA_drugs_df": session.df_fda
+    }
+
+    # Column names of the selected dataframes, including parked ones
+    available_variables = {
+        name: column_names(df_mapping[name], session.fda_lazy if name == 'FDA_drugs_df' else None)
+        for name in state['dfs'] if isinstance(df_mapping.get(name), pd.DataFrame)
+    }
+    # Only the context.py descriptions of columns related to the question
+    data_context = data_context_for(state['messages'][-1].content, available_variables)
+
+    user_message =  f"""{data_context}
+        Dataframes available: {state['dfs']}
+        Task: {state['messages'][-1]}"""
+
+
+    # Error-based rectification request
+    user_message_rectify = f"""The previous code:
+        {state['code'] if isinstance(state.get('code'), str) else 'N/A'}
+
+        gave the following error:
+        {state['result']['error'] if isinstance(state.get('result', {}).get('error'), str) else 'N/A'}
+
+
+        Based on the task and the available variables above,
+        please fix the error while maintaining the original logic."""
+
+    # Choose the correct prompt based on whether there's an error; a retry keeps the same context
+    selected_message = user_message if not state.get('result', {}).get('error') else user_message + "\n" + user_message_rectify
+
+    messages = [
+                {
+                    "role": "system",
+                    "content":  static_prompt,
+                },
+                {
+                    "role": "user",
+                    "content": selected_message,
+                }
+            ]
+    summary = get_llm(model="gpt-4o").invoke(messages)
+    response = summary.content
+
+    return Command(
+        update={'code': clean_code_response(response)},
+        goto= "agent"
+    )
+
+
+def execute_python(code, data, session):
+    """Executes Python code with given context and prevents pandas truncation.
+
+    The code runs in the session's sandbox worker processes when it has them,
+    otherwise in this process."""
+    if session.sandbox is not None:
+        return session.sandbox.run(code, data, session)
+    local_vars = code_namespace(
+        code, data,
+        df_ct=session.df_ct,
+        df_fda=session.df_fda,
+        ct_tables=session.ct_tables,
+        ct_lookup=session.ct_lookup,
+        fda_lazy=session.fda_lazy,
+        search=session.text_index.search,
+        drug_lookup=session.drug_synonyms.lookup if session.drug_synonyms is not None else None,
+    )
+    return run_code(code, local_vars)
+
+
+def agent(state: MessageState, config: RunnableConfig) -> Command[Literal["summarize_result", "__end__"]]:
+    session = _session(config)
+    data = state['dfs']
+
+    result = execute_python(state['code'], data, session)
+    # Initialize retry count if not present
+    retry_count = state.get("retry_count", 0)
+
+    error = result.get("error", None)
+    cache_entry, cache_hit = state.get("cache_entry"), state.get("cache_hit", False)
+    if session.code_cache is not None:
+        if error and cache_hit:
+            # The cached code no longer works on this data; forget it and generate afresh
+            session.code_cache.invalidate(cache_entry)
+            cache_entry, cache_hit = None, False
+        elif not error and cache_hit:
+            session.code_cache.record_success(cache_entry)
+        elif not error:
+            cache_entry = session.code_cache.store(
+                state['messages'][-1].content, data, _fingerprint(session, data), state['code']
+            )
+    if error:
+        session.notify(f"Got erorr in the code, Number of retries : {retry_count + 1}.")
+        if retry_count < 3:
+            retry_count += 1
+            goto_agent = "generate_code"  # Retry code generation
+        else:
+            goto_agent = END
+            session.notify("Max retries reached. Stopping.")
+    else:
+        goto_agent = "summarize_result"
+
+
+    return Command(
+            update={"result": result,
+                    "out_df": result['result_df'],
+                    "last_df_name":result['last_df_name'],
+                    "retry_count": retry_count,
+                    "cache_entry": cache_entry,
+                    "cache_hit": cache_hit,
+                    },
+            goto= goto_agent
+        )
+
+
+def _result_key(question, output, result):
+    """Hash a question with its full output and result, to look up a summary written for exactly that."""
+    digest = hashlib.sha1(f"{normalize_question(question)}\x00{output}\x00".encode())
+    if isinstance(result, (pd.DataFrame, pd.Series)):
+        # str() of a frame only shows its first and last rows, so hash every value instead
+        frame = result.to_frame() if isinstance(result, pd.Series) else result
+        digest.update(f"{list(frame.columns)}\x00{list(frame.dtypes.astype(str))}\x00".encode())
+        try:
+            digest.update(pd.util.hash_pandas_object(frame, index=True).values.tobytes())
+        except TypeError:
+            # Unhashable cells such as lists
+            digest.update(frame.to_csv().encode())
+    else:
+        digest.update(repr(result).encode())
+    return digest.hexdigest()
+
+
+def summarize_result(state: MessageState) -> Command[Literal[ "__end__"]]:
+    """Summarize the result of the code execution to human understable language"""
+    # Large results are cut down to a sample and column statistics; the app still shows the full frame
+    output, data, compacted = compact_result(state['result']['output'], state['out_df'])
+    summarize_prompt = f"""Write the answer to the query from the output and ONLY IF REQUIRED to anser take help of DATA
+                        - The audience is experts in lifesciences and healthcare sector
+                        - The answer must provide clarity
+                        - Query: {state['messages'][-1]}
+                        - Output: {output}
+                        - Data: {data}
+                        """
+    if compacted:
+        summarize_prompt += """- The result was too large to include in full: Output lists only its first and last lines, and
+                          Data gives the row count, per-column statistics and a sample of rows. Base counts and totals on these.
+                        """
+
+    messages = [
+        (
+            "system",
+            "You are a good at answering and summarizing results. Summarize results of data based on the user's query.",
+        ),
+        ("human", summarize_prompt),
+    ]
+
+    # Cached code that reproduced an earlier output exactly gets that output's summary back
+    cache_entry = state.get("cache_entry")
+    result_key = _result_key(state['messages'][-1].content, state['result']['output'], state['out_df'])
+    summary_text = cache_entry.summary_for(result_key) if state.get("cache_hit") else None
+    if summary_text is None:
+        summary = get_llm(model="gpt-4o", max_tokens=None).invoke(messages)
+        summary_text = summary.content
+        if cache_entry is not None:
+            cache_entry.add_summary(result_key, summary_text)
+
+    return Command(
+        update={"summary": summary_text},
+        goto= END,
+    )
+
+
+def build_graph():
+    """Build and compile the question-answering graph."""
+    builder = StateGraph(MessageState)
+    builder.add_edge(START, "check_code_cache")
+    builder.add_node("check_code_cache", check_code_cache)
+    builder.add_node("select_dataframe", select_dataframe)
+    builder.add_node("generate_code", generate_code)
+    builder.add_node("agent", agent)
+    builder.add_node("summarize_result", summarize_result)
+    return builder.compile()
+
+
+_graph = None
+_graph_lock = threading.Lock()
+
+
+def get_graph():
+    """Return the process-wide compiled graph, building it on first use."""
+    global _graph
+    with _graph_lock:
+        if _graph is None:
+            _graph = build_graph()
+        return _graph
+
+
+def run_question(prompt, session):
+    """
+    Answer one chat message with the shared graph.
+
+    Args:
+        prompt (str): The user's question.
+        session (SessionData): The data of the asking session.
+
+    Returns:
+        dict: The final graph state.
+    """
+    return get_graph().invoke(
+        {
+            "messages": [HumanMessage(content=prompt)],
+            "code": "",
+            "result": {},
+            "retry_count": 0,  # Initialize retry count
+            "next": "",  # Define the next step (empty for now)
+            "dfs": [],  # Initialize as an empty list
+            "out_df": None, # Initialize out_df to None or an empty DataFrame
+            "summary": "",
+            "last_df_name":"",
+            "cache_entry": None,
+            "cache_hit": False,
+        },
+        config={"configurable": {"session": session}},
+    )